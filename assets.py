@@ -0,0 +1,140 @@
+import hashlib
+import io
+import os
+import stat
+import tempfile
+import threading
+
+try:
+    from PIL import Image # Opcional: sem o Pillow o logo entra no documento sem otimização
+except ImportError:
+    Image = None
+
+# ==========================================
+# ARQUIVOS ESTÁTICOS (LOGO)
+# ==========================================
+# Módulo leve (sem pandas/python-docx): o app consegue mostrar a página antes de importar
+# o núcleo. Os arquivos são lidos do disco uma vez por processo e reaproveitados em cada
+# create_header; se o arquivo mudar (mtime/tamanho), é lido de novo.
+# Imagens são redimensionadas para a largura em que aparecem (no documento: 7,5" a PRINT_DPI)
+# e regravadas como PNG otimizado; o resultado fica em memória e em disco, com a chave
+# hash do arquivo original + largura, e é o que todo documento embute.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO_PATH = os.path.join(BASE_DIR, 'logo.png')
+LOGO_WIDTH_IN = 7.5 # Largura do logo no cabeçalho (polegadas)
+PRINT_DPI = int(os.environ.get('REPORT_LOGO_DPI', 300))
+UI_LOGO_PX = 1600 # Coluna central do app em telas de alta densidade
+PNG_COLORS = 256 # Paleta do PNG otimizado (0 mantém RGB/RGBA completo)
+
+# Incrementar quando o processamento mudar, para invalidar imagens antigas em disco
+ASSET_VERSION = 2
+# Caches em disco ficam no diretório de cache do usuário (nunca no /tmp compartilhado,
+# onde outro usuário poderia criar o diretório antes e injetar imagens ou fragmentos)
+CACHE_ROOT = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'geradordereports',
+)
+DEFAULT_ASSET_DIR = os.environ.get('REPORT_ASSET_CACHE', os.path.join(CACHE_ROOT, 'assets'))
+
+_ASSET_CACHE = {}
+_IMAGE_CACHE = {}
+_lock = threading.Lock()
+
+def asset_key(path):
+    # (caminho absoluto, mtime, tamanho) ou None se o arquivo não existir
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+def private_dir(path):
+    # Cria o diretório só para o usuário atual (0o700). False se não der para criar ou se ele
+    # já existir e não for seguro: link simbólico, de outro usuário ou gravável por grupo/outros.
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(st.st_mode): return False
+    if os.name == 'posix' and (st.st_uid != os.getuid() or st.st_mode & 0o022): return False
+    return True
+
+def read_asset(path):
+    # Bytes do arquivo (None se não existir)
+    key = asset_key(path)
+    if key is None: return None
+    with _lock:
+        cached = _ASSET_CACHE.get(key[0])
+        if cached is not None and cached[0] == key: return cached[1]
+    with open(path, 'rb') as f:
+        data = f.read()
+    with _lock:
+        _ASSET_CACHE[key[0]] = (key, data)
+    return data
+
+# ==========================================
+# IMAGENS OTIMIZADAS (LOGO DO CABEÇALHO E DA INTERFACE)
+# ==========================================
+
+def optimize_png(data, width_px, dpi=None, colors=PNG_COLORS):
+    # Redimensiona (só reduz) mantendo a proporção, descarta metadados (EXIF, XMP, ICC) e o
+    # canal alfa quando a imagem é toda opaca, e reduz a paleta; fica o menor PNG entre as opções
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    original_width = image.width
+    if image.mode not in ('RGB', 'RGBA'): image = image.convert('RGBA')
+    if image.mode == 'RGBA' and image.getchannel('A').getextrema() == (255, 255): image = image.convert('RGB')
+    if image.width > width_px:
+        image = image.resize((width_px, max(1, round(image.height * width_px / image.width))), Image.LANCZOS)
+    candidates = [image]
+    if colors:
+        # MAXCOVERAGE não aceita alfa; com transparência, FASTOCTREE mantém a paleta RGBA
+        method = Image.Quantize.MAXCOVERAGE if image.mode == 'RGB' else Image.Quantize.FASTOCTREE
+        candidates.append(image.quantize(colors, method=method, dither=Image.Dither.NONE))
+    outputs = [data] if image.width == original_width else [] # Sem redimensionar, o original também vale
+    for candidate in candidates:
+        buffer = io.BytesIO()
+        candidate.save(buffer, 'PNG', optimize=True, **({'dpi': (dpi, dpi)} if dpi else {}))
+        outputs.append(buffer.getvalue())
+    return min(outputs, key=len)
+
+def _cache_path(key, directory):
+    return os.path.join(directory, key + '.png')
+
+def optimized_image(path, width_px, dpi=None, directory=None):
+    # PNG otimizado (bytes) de uma imagem; None se o arquivo não existir. Sem o Pillow devolve o original.
+    data = read_asset(path)
+    if data is None or Image is None: return data
+    digest = hashlib.sha256(data).hexdigest()
+    key = hashlib.sha256(repr((ASSET_VERSION, digest, width_px, dpi, PNG_COLORS)).encode('utf-8')).hexdigest()
+    with _lock:
+        cached = _IMAGE_CACHE.get(key)
+    if cached is not None: return cached
+    directory = directory or DEFAULT_ASSET_DIR
+    # Diretório inseguro ou sem permissão: a imagem é processada e fica só em memória
+    target = _cache_path(key, directory) if private_dir(directory) else None
+    cached = None
+    if target is not None:
+        try:
+            with open(target, 'rb') as f: cached = f.read()
+        except OSError:
+            pass
+    if cached is None:
+        cached = optimize_png(data, width_px, dpi)
+        if target is not None:
+            try:
+                # Grava num temporário e renomeia: outro processo nunca lê uma imagem incompleta
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f: f.write(cached)
+                os.replace(tmp_path, target)
+            except OSError:
+                pass # Sem disco gravável: fica só o cache em memória
+    with _lock:
+        _IMAGE_CACHE[key] = cached
+    return cached
+
+def print_logo(path=LOGO_PATH, width_in=LOGO_WIDTH_IN, dpi=PRINT_DPI):
+    # Logo do cabeçalho na resolução de impressão da largura em que aparece
+    return optimized_image(path, round(width_in * dpi), dpi)
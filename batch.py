@@ -0,0 +1,180 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+from report_core import DEFAULT_STYLE_CONFIG, ReportError, generate_professional_docx, group_tests, load_model, read_workbook, write_docx
+from stream_writer import generate_streaming_docx, write_output, write_streaming_docx
+from parallel_render import generate_parallel_docx, write_parallel_docx
+from assets import private_dir
+from fragment_cache import DEFAULT_CACHE_DIR, FragmentCache, write_incremental_docx
+from model import MODEL_SUFFIXES, is_model_path, save_model
+
+INPUT_SUFFIXES = ('.xlsx', '.csv', '.parquet')
+
+# ==========================================
+# MODO LOTE (CLI) - VÁRIAS PLANILHAS EM PARALELO
+# ==========================================
+# Uso: python batch.py planilhas/ "outras/*.xlsx" -o relatorios/ --workers 8
+# Também aceita exportações .csv/.parquet e modelos salvos (.jsonl / .jsonl.gz, ver --save-model), renderizados sem reler o Excel.
+
+def collect_workbooks(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            found = [p for suffix in INPUT_SUFFIXES + MODEL_SUFFIXES for p in glob.glob(os.path.join(item, '*' + suffix))]
+        else:
+            found = glob.glob(item)
+        # Ignora arquivos de lock do Excel (~$planilha.xlsx)
+        paths.extend(p for p in sorted(found) if not os.path.basename(p).startswith('~$'))
+    # Remove duplicados mantendo a ordem
+    return list(dict.fromkeys(paths))
+
+def _split_name(workbook_path):
+    # 'trials.jsonl.gz' -> ('trials', '.jsonl.gz'); 'trials.csv' -> ('trials', '.csv')
+    name = os.path.basename(workbook_path)
+    suffix = next((s for s in MODEL_SUFFIXES[::-1] if name.lower().endswith(s)), os.path.splitext(name)[1])
+    return name[:len(name) - len(suffix)], suffix
+
+def output_path_for(workbook_path, output_dir, extension='.docx', stem=None):
+    return os.path.join(output_dir, f"{stem or _split_name(workbook_path)[0]}{extension}")
+
+def assign_output_stems(workbook_paths):
+    # Nome de saída por entrada, sem colisões: entradas com o mesmo nome (trials.xlsx e
+    # trials.csv, ou a mesma planilha em diretórios diferentes) gravariam o mesmo arquivo.
+    # Quem colide ganha a extensão no nome (trials_csv); se ainda colidir, um número.
+    def _key(stem): return stem.lower() # Sistemas de arquivos sem distinção de maiúsculas
+    names = {path: _split_name(path) for path in workbook_paths}
+    counts = {}
+    for stem, _ in names.values(): counts[_key(stem)] = counts.get(_key(stem), 0) + 1
+    stems, used = {}, set()
+    for path, (stem, suffix) in names.items():
+        if counts[_key(stem)] > 1: stem = f"{stem}_{suffix.lstrip('.').replace('.', '_')}"
+        candidate, n = stem, 2
+        while _key(candidate) in used:
+            candidate = f"{stem} ({n})"; n += 1
+        used.add(_key(candidate))
+        stems[path] = candidate
+    return stems
+
+def grouped_writer(streaming=False, page_workers=1, chunk_size=None, fragment_dir=None, stats=None):
+    # Writer para testes já agrupados (modelo salvo ou planilha lida de uma vez)
+    if fragment_dir: return partial(write_incremental_docx, cache=FragmentCache(fragment_dir), stats=stats)
+    if page_workers > 1: return partial(write_parallel_docx, workers=page_workers, chunk_size=chunk_size)
+    if streaming: return write_streaming_docx
+    return write_docx
+
+def render_workbook(workbook_path, output_path, cfg, streaming=False, page_workers=1, chunk_size=None, fragment_dir=None, model_path=None):
+    # Executado no processo filho: devolve (tempo, erro, observação) em vez de propagar a exceção
+    start = time.perf_counter()
+    note = ''
+    try:
+        if fragment_dir or model_path or is_model_path(workbook_path):
+            stats = {}
+            if is_model_path(workbook_path):
+                tests = load_model(workbook_path)
+            else:
+                tests = group_tests(read_workbook(workbook_path, cfg['sheet_target']))
+            if model_path:
+                save_model(tests, model_path, source=os.path.basename(workbook_path), sheet=cfg['sheet_target'])
+            writer = grouped_writer(streaming, page_workers, chunk_size, fragment_dir, stats)
+            write_output(lambda f: writer(tests, cfg, f), output_path)
+            if fragment_dir: note = f" [{stats['reused']} reaproveitados, {stats['rendered']} re-renderizados]"
+        elif page_workers > 1:
+            generate_parallel_docx(workbook_path, cfg, output_path=output_path, workers=page_workers, chunk_size=chunk_size)
+        elif streaming:
+            generate_streaming_docx(workbook_path, cfg, output_path=output_path)
+        else:
+            buffer = generate_professional_docx(workbook_path, cfg)
+            with open(output_path, 'wb') as f:
+                f.write(buffer.getbuffer())
+        error = None
+    except ReportError as e:
+        error = str(e)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return time.perf_counter() - start, error, note
+
+def build_config(args):
+    cfg = dict(DEFAULT_STYLE_CONFIG)
+    cfg.update({
+        "font_name": args.font,
+        "h1": args.h1,
+        "h2": args.h2,
+        "body": args.body,
+        "small": args.small,
+        "margins": (args.margin_top, args.margin_bottom, args.margin_side, args.margin_side),
+        "sheet_target": args.sheet
+    })
+    return cfg
+
+def parse_args(argv=None):
+    d = DEFAULT_STYLE_CONFIG
+    parser = argparse.ArgumentParser(description="Gera um relatório DOCX (Apêndice B) para cada planilha (.xlsx, .csv ou .parquet).")
+    parser.add_argument('inputs', nargs='+', help="Diretórios ou padrões glob de planilhas .xlsx/.csv/.parquet (ou modelos .jsonl/.jsonl.gz)")
+    parser.add_argument('-o', '--output-dir', default='relatorios', help="Diretório de saída dos DOCX")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="Número de processos")
+    parser.add_argument('--streaming', action='store_true', help="Grava o document.xml em fluxo direto no arquivo (apêndices muito grandes)")
+    parser.add_argument('--page-workers', type=int, default=1, help="Processos por planilha para renderizar seções em paralelo")
+    parser.add_argument('--chunk-size', type=int, default=0, help="Testes por bloco paralelo (0 = um bloco por seção)")
+    parser.add_argument('--reuse-fragments', metavar='DIR', nargs='?', const=DEFAULT_CACHE_DIR, default=None,
+                        help="Reaproveita páginas de testes inalterados do cache em disco (DIR opcional)")
+    parser.add_argument('--save-model', action='store_true', help="Salva também o modelo lido (.jsonl.gz) ao lado do DOCX, para renderizar de novo sem o Excel")
+    parser.add_argument('--sheet', default=d['sheet_target'], help="Aba da planilha (nome ou índice)")
+    parser.add_argument('--font', default=d['font_name'])
+    parser.add_argument('--h1', type=int, default=d['h1'])
+    parser.add_argument('--h2', type=int, default=d['h2'])
+    parser.add_argument('--body', type=int, default=d['body'])
+    parser.add_argument('--small', type=int, default=d['small'])
+    parser.add_argument('--margin-top', type=float, default=d['margins'][0])
+    parser.add_argument('--margin-bottom', type=float, default=d['margins'][1])
+    parser.add_argument('--margin-side', type=float, default=d['margins'][2])
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    workbooks = collect_workbooks(args.inputs)
+    if not workbooks:
+        print("Nenhuma planilha encontrada.", file=sys.stderr)
+        return 2
+    if args.reuse_fragments and not private_dir(args.reuse_fragments):
+        print(f"Diretório de fragmentos inseguro ou sem permissão (precisa ser do usuário atual e sem escrita para outros): {args.reuse_fragments}", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    cfg = build_config(args)
+    failures = 0
+    start = time.perf_counter()
+
+    stems = assign_output_stems(workbooks)
+    for path in workbooks:
+        if stems[path] != _split_name(path)[0]:
+            print(f"AVISO {path}: nome repetido entre as entradas, gravado como {output_path_for(path, args.output_dir, stem=stems[path])}", file=sys.stderr)
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {
+            pool.submit(
+                render_workbook, path, output_path_for(path, args.output_dir, stem=stems[path]), cfg,
+                args.streaming, args.page_workers, args.chunk_size or None, args.reuse_fragments,
+                output_path_for(path, args.output_dir, '.jsonl.gz', stems[path]) if args.save_model and not is_model_path(path) else None
+            ): path
+            for path in workbooks
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            elapsed, error, note = future.result()
+            if error:
+                failures += 1
+                print(f"FALHA {path} ({elapsed:.2f}s): {error}", file=sys.stderr)
+            else:
+                print(f"OK    {path} -> {output_path_for(path, args.output_dir, stem=stems[path])} ({elapsed:.2f}s){note}")
+
+    total = time.perf_counter() - start
+    print(f"{len(workbooks) - failures}/{len(workbooks)} relatórios gerados em {total:.2f}s")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
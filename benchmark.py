@@ -0,0 +1,261 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+from openpyxl import Workbook
+
+from report_core import (
+    DEFAULT_STYLE_CONFIG, LOGO_PATH, BASE_DIR, create_header, create_test_page,
+    group_tests, iter_test_pages, new_document, read_workbook
+)
+
+# ==========================================
+# BENCHMARK DE GERAÇÃO (PLANILHA SINTÉTICA)
+# ==========================================
+# Uso: python benchmark.py --sections 10 --tests 20 --steps 8 -o bench.json [--compare antigo.json] [--formats] [--app-latency]
+# Mede cada etapa separadamente (leitura, agrupamento, páginas, save) e o pico de memória,
+# gravando o resultado em JSON para comparar versões. --formats compara a leitura + agrupamento
+# da mesma planilha exportada em .xlsx, .csv e .parquet. --app-latency mede a primeira execução
+# do app.py num processo novo (partida a frio) e as reexecuções ao mexer numa margem.
+
+WORDS = ("thruster", "generator", "switchboard", "DP", "console", "reference", "sensor", "failure",
+         "redundancy", "bus", "tie", "breaker", "heading", "position", "alarm", "mode", "load", "UPS")
+
+def _text(rng, length):
+    words = []
+    while sum(len(w) + 1 for w in words) < length: words.append(rng.choice(WORDS))
+    return " ".join(words)[:length]
+
+def make_workbook(path, sections=5, tests=10, steps=6, text_len=80, extra_cols=10, seed=0):
+    # Planilha no formato do Apêndice B: uma linha por passo, metadados na primeira linha do teste
+    rng = random.Random(seed)
+    header = ['test number', 'Section', 'Test', 'Method', 'Step', 'Expected Result', 'Result + Comment',
+              'Auditor FMEA Comment', 'Witness 1', 'Date', 'FMEA Reference', 'Sub-System', 'Objective']
+    header += [f"Extra {i + 1}" for i in range(extra_cols)] # Colunas que o relatório ignora
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Tests')
+    ws.append(header)
+    number = 0
+    for s in range(sections):
+        for _ in range(tests):
+            number += 1
+            for step in range(steps):
+                first = step == 0
+                ws.append([
+                    f"{s + 1}.{number}", f"{s + 1}. Section {s + 1}",
+                    f"{number} - {_text(rng, 40)}" if first else None,
+                    "\n".join(f"{i + 1}. {_text(rng, text_len)}" for i in range(2)) if first else None,
+                    f"{step + 1}. {_text(rng, text_len)}",
+                    _text(rng, text_len),
+                    _text(rng, text_len) if rng.random() < 0.7 else None,
+                    _text(rng, text_len // 2) if rng.random() < 0.2 else None,
+                    "Chief Engineer" if first else None,
+                    "2025-01-15" if first else None,
+                    f"FMEA-{s + 1}.{number}" if first else None,
+                    "Propulsion" if first else None,
+                    _text(rng, text_len) if first else None
+                ] + [rng.random() for _ in range(extra_cols)])
+    wb.save(path)
+    return sections * tests * steps
+
+def _stages(path, cfg):
+    # Cada etapa recebe o resultado da anterior; devolve pares (nome, função)
+    state = {}
+
+    def read_excel():
+        pd.read_excel(path, sheet_name=0, header=0, dtype={'test number': str})
+
+    def read_pruned():
+        state['df'] = read_workbook(path, 0)
+
+    def grouping():
+        state['tests'] = group_tests(state['df'])
+
+    def header():
+        state['doc'] = new_document(cfg)
+        create_header(state['doc'], LOGO_PATH)
+
+    def render():
+        for test_info, is_first_test, section_title in iter_test_pages(state['tests']):
+            create_test_page(state['doc'], test_info, cfg, is_first_test=is_first_test, section_title=section_title)
+
+    def save():
+        buffer = io.BytesIO()
+        state['doc'].save(buffer)
+        state['docx_bytes'] = buffer.tell()
+
+    stages = [('read_excel', read_excel), ('read_workbook', read_pruned), ('grouping', grouping),
+              ('create_header', header), ('create_test_page', render), ('doc_save', save)]
+    return stages, state
+
+def export_formats(xlsx_path, directory):
+    # Mesmos dados em CSV e Parquet, como viriam do sistema de gestão de testes (todas as colunas)
+    df = pd.read_excel(xlsx_path, sheet_name=0, dtype={'test number': str})
+    paths = {'xlsx': xlsx_path, 'csv': os.path.join(directory, 'bench.csv'), 'parquet': os.path.join(directory, 'bench.parquet')}
+    df.to_csv(paths['csv'], index=False)
+    try:
+        df.to_parquet(paths['parquet'], index=False)
+    except ImportError:
+        del paths['parquet'] # Sem pyarrow
+    return paths
+
+def run_format_benchmark(paths, repeat=3):
+    # Leitura + agrupamento por formato; same_model confere que o modelo é igual ao do .xlsx
+    result, models = {}, {}
+    for fmt, path in paths.items():
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            models[fmt] = group_tests(read_workbook(path, 0))
+            runs.append(time.perf_counter() - start)
+        result[fmt] = {"seconds": statistics.median(runs), "runs": runs, "bytes": os.path.getsize(path)}
+    for fmt in result: result[fmt]["same_model"] = models[fmt] == models['xlsx']
+    return result
+
+# Roda num processo novo (sem pandas/python-docx já importados, como o servidor ao subir).
+# O streamlit é importado antes de começar a contar: só entra o que o app.py carrega.
+_APP_LATENCY_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+start = time.perf_counter(); at.run(); cold = time.perf_counter() - start
+reruns = []
+for i in range(int(sys.argv[2])):
+    at.sidebar.slider[0].set_value(1.0 + 0.1 * (i % 5 + 1))
+    start = time.perf_counter(); at.run(); reruns.append(time.perf_counter() - start)
+print(json.dumps({"cold_s": cold, "reruns": reruns, "exceptions": len(at.exception),
+                  "heavy_modules": [m for m in ('pandas', 'docx') if m in sys.modules]}))
+"""
+
+def run_app_latency(repeat=3, reruns=10, app_path=None):
+    app_path = app_path or os.path.join(BASE_DIR, 'app.py')
+    colds, rerun_times, last = [], [], {}
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-c', _APP_LATENCY_SCRIPT, app_path, str(reruns)],
+                              cwd=os.path.dirname(os.path.abspath(app_path)), capture_output=True, text=True, timeout=600)
+        if proc.returncode != 0: raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "falha no app.py")
+        last = json.loads(proc.stdout.strip().splitlines()[-1])
+        colds.append(last["cold_s"]); rerun_times += last["reruns"]
+    return {
+        "cold_start_s": statistics.median(colds), "cold_runs": colds,
+        "rerun_s": statistics.median(rerun_times) if rerun_times else None, "rerun_runs": rerun_times,
+        "exceptions": last.get("exceptions", 0), "heavy_modules_after_rerun": last.get("heavy_modules", [])
+    }
+
+def run_benchmark(path, cfg, repeat=3, memory=True):
+    timings = {}
+    state = {}
+    for _ in range(repeat):
+        stages, state = _stages(path, cfg)
+        for name, fn in stages:
+            start = time.perf_counter()
+            fn()
+            timings.setdefault(name, []).append(time.perf_counter() - start)
+
+    result = {name: {"seconds": statistics.median(runs), "runs": runs} for name, runs in timings.items()}
+    if memory:
+        # Passada separada: o tracemalloc distorce os tempos
+        stages, _ = _stages(path, cfg)
+        tracemalloc.start()
+        for name, fn in stages:
+            tracemalloc.reset_peak()
+            fn()
+            result[name]["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return result, state
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(current, baseline):
+    print(f"{'etapa':<18}{'antes (s)':>12}{'agora (s)':>12}{'razão':>10}")
+    for name, data in current["stages"].items():
+        before = baseline.get("stages", {}).get(name, {}).get("seconds")
+        if before is None: continue
+        ratio = data["seconds"] / before if before else float('inf')
+        print(f"{name:<18}{before:>12.3f}{data['seconds']:>12.3f}{ratio:>9.2f}x")
+    for name in ('cold_start_s', 'rerun_s'):
+        now, before = current.get("app_latency", {}).get(name), baseline.get("app_latency", {}).get(name)
+        if now is None or not before: continue
+        print(f"{'app.' + name:<18}{before:>12.3f}{now:>12.3f}{now / before:>9.2f}x")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das etapas de geração do relatório com planilha sintética.")
+    parser.add_argument('--sections', type=int, default=5)
+    parser.add_argument('--tests', type=int, default=10, help="Testes por seção")
+    parser.add_argument('--steps', type=int, default=6, help="Passos por teste")
+    parser.add_argument('--text-len', type=int, default=80, help="Tamanho aproximado dos textos (caracteres)")
+    parser.add_argument('--extra-cols', type=int, default=10, help="Colunas extras ignoradas pelo relatório")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="Não mede o pico de memória")
+    parser.add_argument('--formats', action='store_true', help="Compara a leitura de .xlsx, .csv e .parquet")
+    parser.add_argument('--app-latency', action='store_true', help="Mede a partida a frio e as reexecuções do app.py (Streamlit)")
+    parser.add_argument('--reruns', type=int, default=10, help="Reexecuções do app.py por medição")
+    parser.add_argument('-o', '--output', help="Arquivo JSON de resultado")
+    parser.add_argument('--compare', help="JSON de uma execução anterior para comparar")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = {k: getattr(args, k) for k in ('sections', 'tests', 'steps', 'text_len', 'extra_cols', 'seed')}
+    cfg = dict(DEFAULT_STYLE_CONFIG)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.xlsx')
+        start = time.perf_counter()
+        rows = make_workbook(path, **params)
+        print(f"Planilha sintética: {rows} linhas ({time.perf_counter() - start:.2f}s para gerar)")
+        stages, state = run_benchmark(path, cfg, repeat=args.repeat, memory=not args.no_memory)
+        workbook_bytes = os.path.getsize(path)
+        formats = run_format_benchmark(export_formats(path, tmp), repeat=args.repeat) if args.formats else None
+
+    result = {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "rows": rows,
+        "tests": len(state['tests']),
+        "workbook_bytes": workbook_bytes,
+        "docx_bytes": state['docx_bytes'],
+        "stages": stages
+    }
+    for name, data in stages.items():
+        peak = f"  pico {data['peak_mb']:.1f} MB" if 'peak_mb' in data else ""
+        print(f"{name:<18}{data['seconds']:>8.3f}s{peak}")
+    if formats:
+        result["formats"] = formats
+        print(f"{'formato':<10}{'leitura + agrupamento':>24}{'tamanho':>12}")
+        for fmt, data in formats.items():
+            same = "" if data['same_model'] else "  (modelo diferente do .xlsx!)"
+            print(f"{fmt:<10}{data['seconds']:>23.3f}s{data['bytes'] / 1e6:>10.1f}MB{same}")
+
+    if args.app_latency:
+        app = result["app_latency"] = run_app_latency(repeat=args.repeat, reruns=args.reruns)
+        print(f"app.py: partida a frio {app['cold_start_s']:.3f}s, reexecução {app['rerun_s'] or 0:.3f}s "
+              f"(módulos pesados carregados: {', '.join(app['heavy_modules_after_rerun']) or 'nenhum'})")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f: json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f: compare(result, json.load(f))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from instrumentation import NULL_METRICS
+from report_core import detect_format, load_tests, named_stream, source_name, style_key, write_docx
+
+# ==========================================
+# CACHE EM DOIS NÍVEIS
+# ==========================================
+# Nível 1: modelo agrupado (grouped_tests), chave = hash do conteúdo enviado + aba.
+# Nível 2: bytes do DOCX final, chave = chave do modelo + estilo (STYLE_CONFIG).
+# Mudar só fonte/margens reaproveita o modelo e pula a leitura do Excel; um pedido
+# idêntico devolve o DOCX pronto.
+
+class LRUCache:
+    # Limitado por número de itens e, opcionalmente, pelo total de bytes (sizeof(valor))
+    def __init__(self, max_items, max_bytes=None, sizeof=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if self.max_bytes is not None and size > self.max_bytes: return # Maior que o cache inteiro
+            if key in self._items: self.total_bytes -= self.sizeof(self._items.pop(key))
+            self._items[key] = value
+            self.total_bytes += size
+            while len(self._items) > self.max_items or (self.max_bytes is not None and self.total_bytes > self.max_bytes):
+                _, evicted = self._items.popitem(last=False)
+                self.total_bytes -= self.sizeof(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+def read_source_bytes(source):
+    # Caminho, bytes, UploadedFile do Streamlit ou arquivo aberto
+    if isinstance(source, (bytes, bytearray)): return bytes(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f: return f.read()
+    if hasattr(source, 'getvalue'): return source.getvalue()
+    source.seek(0)
+    data = source.read()
+    source.seek(0)
+    return data
+
+class ReportCache:
+    def __init__(self, max_models=4, max_documents=16, max_document_bytes=256 * 1024 * 1024):
+        self.models = LRUCache(max_models)
+        self.documents = LRUCache(max_documents, max_bytes=max_document_bytes, sizeof=len)
+
+    def _model_key(self, source, data, sheet_val):
+        # O formato entra na chave: os mesmos bytes podem ser lidos como planilha ou como CSV
+        return hashlib.sha256(data).hexdigest() + ':' + str(sheet_val) + ':' + detect_format(source)
+
+    def get_model(self, data, sheet_val, metrics=NULL_METRICS, file_name=None):
+        # Devolve (chave do modelo, grouped_tests, veio do cache?). file_name: nome original (define o formato)
+        source = named_stream(data, file_name)
+        model_key = self._model_key(source, data, sheet_val)
+        tests = self.models.get(model_key)
+        if tests is not None: return model_key, tests, True
+        tests = load_tests(source, sheet_val, metrics)
+        self.models.put(model_key, tests)
+        return model_key, tests, False
+
+    def get_document(self, source, cfg, writer=write_docx, metrics=NULL_METRICS, file_name=None):
+        # Devolve (bytes do DOCX, origem): 'document', 'model' ou None (nada reaproveitado).
+        # writer(grouped_tests, cfg, fileobj, metrics) escolhe o backend; a saída é equivalente em todos.
+        with metrics.stage('cache_lookup'):
+            data = read_source_bytes(source)
+            file_name = file_name or source_name(source)
+            sheet_val = cfg.get('sheet_target', '0')
+            model_key = self._model_key(named_stream(data, file_name), data, sheet_val)
+            doc_key = (model_key, style_key(cfg))
+            doc_bytes = self.documents.get(doc_key)
+        if doc_bytes is not None: return doc_bytes, 'document'
+
+        _, tests, model_hit = self.get_model(data, sheet_val, metrics, file_name)
+        metrics.expect('tests', len(tests))
+        buffer = io.BytesIO()
+        writer(tests, cfg, buffer, metrics=metrics)
+        doc_bytes = buffer.getvalue()
+        self.documents.put(doc_key, doc_bytes)
+        return doc_bytes, 'model' if model_hit else None
+
+# Cache do processo: no Streamlit o módulo é importado uma vez e sobrevive aos reruns
+default_cache = ReportCache()
+
+def generate_cached_docx(source, cfg, writer=write_docx, cache=None, metrics=NULL_METRICS, file_name=None):
+    # Igual a generate_professional_docx, mas devolve (BytesIO, origem do cache)
+    doc_bytes, origin = (cache or default_cache).get_document(source, cfg, writer=writer, metrics=metrics, file_name=file_name)
+    return io.BytesIO(doc_bytes), origin
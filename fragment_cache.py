@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from assets import CACHE_ROOT, private_dir
+from instrumentation import NULL_METRICS
+from report_core import iter_test_pages, style_key
+from stream_writer import FragmentRenderer, render_shell, write_docx_from_fragments
+
+# ==========================================
+# REGENERAÇÃO INCREMENTAL (CACHE DE PÁGINAS EM DISCO)
+# ==========================================
+# Cada página de teste recebe uma impressão digital (conteúdo do teste + posição: primeiro
+# teste / título de seção). O XML já renderizado fica em disco com a chave
+# impressão digital + estilo; ao reenviar a planilha só os testes alterados são refeitos.
+
+# Incrementar quando a renderização da página mudar, para invalidar fragmentos antigos
+FRAGMENT_VERSION = 2
+DEFAULT_CACHE_DIR = os.environ.get('REPORT_FRAGMENT_CACHE', os.path.join(CACHE_ROOT, 'fragments'))
+PRUNE_INTERVAL = 300 # Segundos entre varreduras do diretório (por processo e diretório)
+
+_LAST_PRUNE = {}
+_prune_lock = threading.Lock()
+
+def test_fingerprint(test_info):
+    # Conteúdo do teste (TestRecord já limpo, incluindo o 'test number')
+    content = json.dumps(test_info.to_row(), ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def fragment_key(test_info, is_first_test, section_title, cfg):
+    page = repr((FRAGMENT_VERSION, style_key(cfg), test_fingerprint(test_info), is_first_test, section_title))
+    return hashlib.sha256(page.encode('utf-8')).hexdigest()
+
+class FragmentCache:
+    # Cache de melhor esforço: falhas de disco (fragmento removido pelo prune de outro job,
+    # diretório sem permissão ou cheio) só fazem a página ser renderizada de novo.
+    # Diretório que não é privado do usuário (ver assets.private_dir) desliga o cache: um
+    # fragmento plantado por outro usuário entraria direto no documento.
+    def __init__(self, directory=None, max_bytes=512 * 1024 * 1024):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.enabled = private_dir(self.directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.xml')
+
+    def get(self, key):
+        if not self.enabled: return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f: data = f.read()
+        except OSError:
+            return None
+        try: os.utime(path) # Marca como usado recentemente para o prune
+        except OSError: pass
+        return data
+
+    def put(self, key, data):
+        # Devolve False se não conseguiu gravar
+        if not self.enabled: return False
+        path = self._path(key)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Grava num temporário e renomeia: outro processo nunca lê um fragmento incompleto
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f: f.write(data)
+            os.replace(tmp_path, path)
+            return True
+        except OSError:
+            if tmp_path is not None:
+                try: os.remove(tmp_path)
+                except OSError: pass
+            return False
+
+    def maybe_prune(self, interval=PRUNE_INTERVAL):
+        # O prune percorre o diretório inteiro: roda no máximo uma vez a cada interval segundos
+        with _prune_lock:
+            last = _LAST_PRUNE.get(self.directory)
+            if last is not None and time.monotonic() - last < interval: return False
+            _LAST_PRUNE[self.directory] = time.monotonic()
+        self.prune()
+        return True
+
+    def prune(self):
+        # Remove os fragmentos usados há mais tempo até caber em max_bytes
+        if not self.enabled: return
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.xml'): continue
+                path = os.path.join(root, name)
+                try: st = os.stat(path)
+                except OSError: continue
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            try: os.remove(path)
+            except OSError: continue
+            total -= size
+
+def write_incremental_docx(grouped_tests, cfg, fileobj, metrics=NULL_METRICS, cache=None, stats=None):
+    # Mesma assinatura dos outros writers; stats (dict) recebe 'reused' e 'rendered'
+    cache = cache or FragmentCache()
+    stats = stats if stats is not None else {}
+    stats.update(reused=0, rendered=0)
+    with metrics.stage('create_header'):
+        shell, shell_buffer = render_shell(cfg)
+    renderer = None
+
+    def _fragments():
+        nonlocal renderer
+        for test_info, is_first_test, section_title in iter_test_pages(grouped_tests, metrics):
+            key = fragment_key(test_info, is_first_test, section_title, cfg)
+            fragment = cache.get(key)
+            if fragment is not None:
+                stats['reused'] += 1
+            else:
+                if renderer is None: renderer = FragmentRenderer(cfg, shell.element)
+                fragment = renderer.render(test_info, is_first_test, section_title)
+                cache.put(key, fragment)
+                stats['rendered'] += 1
+            yield fragment
+
+    write_docx_from_fragments(metrics.timed_iter('create_test_page', _fragments()), shell_buffer, fileobj, metrics)
+    metrics.count('reused_pages', stats['reused']); metrics.count('rendered_pages', stats['rendered'])
+    if stats['rendered']: # Só cresce quando algo foi gravado
+        with metrics.stage('fragment_prune'):
+            cache.maybe_prune()
+    return fileobj
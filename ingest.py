@@ -0,0 +1,339 @@
+import io
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+try:
+    import pyarrow.parquet as pq # Opcional: só para entradas .parquet
+except ImportError:
+    pq = None
+
+from model import MODEL_FORMAT, MODEL_VERSION, TestRecord, open_model_file
+
+# ==========================================
+# INGESTÃO DA PLANILHA
+# ==========================================
+
+# Colunas mínimas que toda aba precisa ter para gerar o apêndice
+REQUIRED_COLS = ['test number', 'Section', 'Test', 'Method', 'Step', 'Expected Result']
+# Colunas opcionais usadas pelo relatório; todas as outras são descartadas na leitura
+OPTIONAL_COLS = ['Witness 1', 'Date', 'FMEA Reference', 'Sub-System', 'Objective', 'Auditor FMEA Comment', 'Result + Comment']
+USED_COLS = REQUIRED_COLS + OPTIONAL_COLS
+
+# Textos que o pd.read_excel converte para NaN por padrão, mais os códigos de erro do Excel
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+    'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+    '#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!'
+}
+
+# Erro de entrada (aba inexistente, colunas faltando, arquivo ilegível)
+class ReportError(Exception):
+    pass
+
+# Um mesmo 'test number' reaparece depois de outro teste: o agrupamento em fluxo não pode fechá-lo
+class NonContiguousTestsError(Exception):
+    pass
+
+def parse_sheet_target(sheet_val):
+    # Tenta converter para inteiro (índice); se falhar, usa como string (nome da aba)
+    try:
+        return int(sheet_val)
+    except (TypeError, ValueError):
+        return sheet_val
+
+def _convert_cell(value):
+    # Mesma normalização do leitor openpyxl do pandas: vazio/erro -> NaN, float inteiro -> int
+    if value is None: return math.nan
+    if isinstance(value, str):
+        return math.nan if value in NA_STRINGS else value
+    if isinstance(value, float) and value.is_integer(): return int(value)
+    return value
+
+def _iter_worksheet_rows(ws):
+    # Um dict por linha contendo apenas as colunas de USED_COLS presentes no cabeçalho
+    ws.reset_dimensions() # Algumas planilhas gravam dimensões erradas; força a leitura real
+
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None) or ()
+    positions = {}
+    for idx, name in enumerate(header):
+        # Em colunas duplicadas vale a primeira, como no pandas
+        if name is not None and str(name) in USED_COLS: positions.setdefault(str(name), idx)
+
+    missing = [c for c in REQUIRED_COLS if c not in positions]
+    if missing:
+        raise ReportError(f"A aba selecionada não possui as colunas obrigatórias: {missing}. Tente outra aba.")
+
+    last_col = max(positions.values()) + 1
+    selected = list(positions.items())
+    for values in ws.iter_rows(min_row=2, max_col=last_col, values_only=True):
+        if len(values) < last_col: values = tuple(values) + (None,) * (last_col - len(values))
+        row = {name: _convert_cell(values[idx]) for name, idx in selected}
+        # 'test number' sempre como texto (equivalente a dtype={'test number': str})
+        if pd.notna(row['test number']): row['test number'] = str(row['test number'])
+        yield row
+
+def _open_workbook(source):
+    try:
+        return load_workbook(source, read_only=True, data_only=True)
+    except Exception as e:
+        raise ReportError(f"Erro ao ler o arquivo Excel: {e}")
+
+def _get_worksheet(wb, sheet_target):
+    try:
+        return wb.worksheets[sheet_target] if isinstance(sheet_target, int) else wb[sheet_target]
+    except (IndexError, KeyError):
+        raise ReportError(f"Erro: Não foi possível encontrar a aba '{sheet_target}'. Verifique se o nome/índice está correto na barra lateral.")
+
+def iter_sheet_rows(source, sheet_val):
+    # Lê a aba em modo read-only (linha a linha, sem carregar a planilha inteira) e devolve
+    # um dict por linha contendo apenas as colunas de USED_COLS presentes no cabeçalho.
+    wb = _open_workbook(source)
+    try:
+        yield from _iter_worksheet_rows(_get_worksheet(wb, parse_sheet_target(sheet_val)))
+    finally:
+        wb.close()
+
+def read_workbook(source, sheet_val):
+    # Tabela completa (apenas colunas usadas), com dtype object para preservar o tipo de cada célula.
+    # Também aceita exportações CSV e Parquet (nesse caso a aba é ignorada).
+    fmt = detect_format(source)
+    if fmt == 'csv': return read_csv_table(source)
+    if fmt == 'parquet': return read_parquet_table(source)
+    return _rows_frame(list(iter_sheet_rows(source, sheet_val)))
+
+def _rows_frame(rows):
+    df = pd.DataFrame(rows, dtype=object)
+    for col in REQUIRED_COLS:
+        if col not in df.columns: df[col] = pd.Series(dtype=object)
+    return df
+
+# ==========================================
+# EXPORTAÇÕES CSV E PARQUET
+# ==========================================
+# Leitura colunar direta (sem openpyxl), com as mesmas regras da planilha: apenas USED_COLS,
+# validação de REQUIRED_COLS, textos de NA_STRINGS como vazio e 'test number' sempre texto.
+
+INPUT_FORMATS = {'.xlsx': 'xlsx', '.xlsm': 'xlsx', '.csv': 'csv', '.txt': 'csv', '.parquet': 'parquet', '.pq': 'parquet'}
+CSV_DELIMITERS = (',', ';', '\t', '|')
+
+def _peek(source, size=4096):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f: return f.read(size)
+    pos = source.tell()
+    data = source.read(size)
+    source.seek(pos)
+    return data
+
+def source_name(source):
+    # Nome do arquivo de origem (caminho, UploadedFile ou arquivo aberto), se houver
+    if isinstance(source, (str, os.PathLike)): return os.fspath(source)
+    name = getattr(source, 'name', None)
+    return name if isinstance(name, str) else None
+
+def named_stream(data, name=None):
+    # Bytes já lidos (ex.: fila de jobs) com o nome original, para detect_format usar a extensão
+    stream = io.BytesIO(data)
+    stream.name = name
+    return stream
+
+def detect_format(source):
+    # Pela extensão (caminho ou .name do UploadedFile); sem extensão conhecida, pelo conteúdo:
+    # .xlsx é um zip (PK) e .parquet começa com PAR1; o resto é tratado como texto (CSV)
+    name = source_name(source)
+    fmt = INPUT_FORMATS.get(os.path.splitext(name)[1].lower()) if name else None
+    if fmt: return fmt
+    try:
+        head = _peek(source, 8)
+    except (OSError, AttributeError):
+        return 'xlsx' # O leitor do Excel informa o erro
+    if head.startswith(b'PAR1'): return 'parquet'
+    if head.startswith(b'PK') or head.startswith(b'\xd0\xcf\x11\xe0'): return 'xlsx' # Zip ou .xls antigo (OLE)
+    return 'csv'
+
+def _check_columns(columns):
+    missing = [c for c in REQUIRED_COLS if c not in columns]
+    if missing:
+        raise ReportError(f"O arquivo não possui as colunas obrigatórias: {missing}. Verifique o cabeçalho da exportação.")
+
+def _table_frame(df, convert):
+    # convert=True normaliza célula a célula como na planilha (floats inteiros -> int, NA_STRINGS -> NaN)
+    columns = {}
+    for col in df.columns:
+        values = df[col].to_numpy(dtype=object)
+        columns[col] = [_convert_cell(None if v is pd.NaT else v) for v in values] if convert else values
+    numbers = columns['test number']
+    columns['test number'] = [str(v) if pd.notna(v) else v for v in numbers]
+    return pd.DataFrame(columns, dtype=object)
+
+def read_csv_table(source):
+    head = _peek(source)
+    first_line = head.split(b'\n', 1)[0]
+    sep = max(CSV_DELIMITERS, key=lambda d: first_line.count(d.encode()))
+    pos = None if isinstance(source, (str, os.PathLike)) else source.tell()
+    options = dict(sep=sep, dtype=str, usecols=lambda c: c in USED_COLS, na_values=sorted(NA_STRINGS), keep_default_na=False)
+    try:
+        try:
+            df = pd.read_csv(source, encoding='utf-8-sig', **options)
+        except UnicodeDecodeError:
+            # Exportações do Excel no Windows costumam vir em cp1252
+            if pos is not None: source.seek(pos)
+            df = pd.read_csv(source, encoding='cp1252', **options)
+    except (ValueError, pd.errors.ParserError) as e:
+        raise ReportError(f"Erro ao ler o arquivo CSV: {e}")
+    _check_columns(df.columns)
+    return _table_frame(df, convert=False)
+
+def read_parquet_table(source):
+    if pq is None:
+        raise ReportError("Erro: a leitura de arquivos Parquet requer o pacote 'pyarrow'.")
+    try:
+        parquet_file = pq.ParquetFile(source)
+        columns = [c for c in parquet_file.schema_arrow.names if c in USED_COLS]
+    except Exception as e:
+        raise ReportError(f"Erro ao ler o arquivo Parquet: {e}")
+    _check_columns(columns)
+    columns = list(dict.fromkeys(columns)) # Em colunas duplicadas vale a primeira
+    df = parquet_file.read(columns=columns).to_pandas()
+    # Colunas tipadas (números, datas) passam pela mesma normalização das células do Excel
+    return _table_frame(df, convert=True)
+
+def read_workbook_sheets(source, sheet_vals=None):
+    # Várias abas numa única abertura do arquivo (equivalente a sheet_name=None ou a uma lista).
+    # Devolve ({nome da aba: DataFrame}, {aba: mensagem de erro}) — abas inválidas não interrompem as demais.
+    wb = _open_workbook(source)
+    frames, skipped = {}, {}
+    try:
+        targets = wb.sheetnames if sheet_vals is None else [parse_sheet_target(v) for v in sheet_vals]
+        for target in targets:
+            try:
+                ws = _get_worksheet(wb, target)
+                if ws.title in frames: continue # Mesma aba pedida por nome e por índice
+                frames[ws.title] = _rows_frame(list(_iter_worksheet_rows(ws)))
+            except ReportError as e:
+                skipped[str(target)] = str(e)
+    finally:
+        wb.close()
+    return frames, skipped
+
+class _RowGroup:
+    # Linhas de um teste durante o agrupamento em fluxo; metadados vêm da primeira linha
+    def __init__(self, first_row):
+        self.first = first_row
+        self.steps, self.expected, self.results, self.comments = [], [], [], []
+
+    def add(self, row):
+        self.steps.append(row.get('Step', ''))
+        # Comentários
+        a_comm = row.get('Auditor FMEA Comment')
+        if pd.notna(a_comm) and str(a_comm).strip():
+            self.comments.append((len(self.steps), str(a_comm).strip()))
+        self.expected.append(row.get('Expected Result', ''))
+        self.results.append(row.get('Result + Comment', ''))
+
+    def record(self, test_number):
+        row = self.first
+        return TestRecord.from_values(
+            test_number, row.get('Test', 'Test Title'), row.get('Method', ''), row.get('Section', 'Section Name'),
+            row.get('Objective', ''), row.get('FMEA Reference', ''), row.get('Sub-System', ''),
+            row.get('Witness 1', ''), row.get('Date', ''), self.steps, self.expected, self.results, self.comments
+        )
+
+def iter_workbook_tests(source, sheet_val):
+    # Agrupamento incremental: cada teste é entregue assim que o 'test number' muda,
+    # então a memória de pico acompanha o maior teste e não o tamanho da aba.
+    if detect_format(source) != 'xlsx':
+        # CSV/Parquet: a leitura colunar já é rápida; agrupa a tabela inteira
+        yield from group_tests(read_workbook(source, sheet_val)).items()
+        return
+    closed = set()
+    current_number = None
+    current = None
+    for row in iter_sheet_rows(source, sheet_val):
+        test_number = row['test number']
+        if not isinstance(test_number, str): continue
+
+        if test_number != current_number:
+            if current is not None:
+                closed.add(current_number)
+                yield current_number, current.record(current_number)
+            if test_number in closed:
+                raise NonContiguousTestsError(test_number)
+            current_number = test_number
+            current = _RowGroup(row)
+        current.add(row)
+
+    if current is not None:
+        yield current_number, current.record(current_number)
+
+def group_tests(df):
+    # Agrupamento colunar: uma passada por coluna em vez de df.iterrows() linha a linha.
+    # Mantém a semântica original: metadados da primeira linha de cada teste, ordem de
+    # inserção (primeira aparição) e comentários numerados pela posição do passo no teste.
+    grouped_tests = {}
+    if df.empty: return grouped_tests
+    valid = df[df['test number'].notna()]
+    if valid.empty: return grouped_tests
+
+    groups = valid.groupby('test number', sort=False)
+    codes = groups.ngroup().to_numpy()
+    order = np.argsort(codes, kind='stable') # linhas agrupadas, preservando a ordem dentro do teste
+    ends = np.cumsum(np.bincount(codes)).tolist()
+    starts = [0] + ends[:-1]
+    first_rows = order[starts]
+
+    def _column(name, default):
+        if name in valid.columns: return valid[name].to_numpy(dtype=object)
+        return np.full(len(valid), default, dtype=object)
+
+    def _first(name, default):
+        return _column(name, default)[first_rows].tolist()
+
+    def _lists(name):
+        values = _column(name, '')[order].tolist()
+        return [values[s:e] for s, e in zip(starts, ends)]
+
+    # Comentários do auditor: limpeza feita na coluna inteira de uma vez
+    step_comments = [[] for _ in starts]
+    if 'Auditor FMEA Comment' in valid.columns:
+        comments = valid['Auditor FMEA Comment'].map(lambda v: str(v).strip(), na_action='ignore')
+        mask = (comments.notna() & comments.ne('')).to_numpy()
+        step_numbers = groups.cumcount().to_numpy() + 1
+        for code, step, text in zip(codes[mask].tolist(), step_numbers[mask].tolist(), comments.to_numpy(dtype=object)[mask].tolist()):
+            step_comments[code].append((step, text))
+
+    columns = zip(
+        _first('test number', '000'), _first('Test', 'Test Title'), _first('Method', ''), _first('Section', 'Section Name'),
+        _first('Objective', ''), _first('FMEA Reference', ''), _first('Sub-System', ''), _first('Witness 1', ''), _first('Date', ''),
+        _lists('Step'), _lists('Expected Result'), _lists('Result + Comment'), step_comments
+    )
+    for values in columns:
+        grouped_tests[values[0]] = TestRecord.from_values(*values)
+    return grouped_tests
+
+# ==========================================
+# MODELO SALVO (JSON LINES)
+# ==========================================
+
+def iter_model(source):
+    # (test number, TestRecord) em fluxo a partir de um modelo salvo com model.save_model
+    with open_model_file(source, 'r') as f:
+        try:
+            header = json.loads(f.readline() or 'null')
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get('format') != MODEL_FORMAT:
+            raise ReportError("Erro: o arquivo não é um modelo de relatório salvo.")
+        if header.get('version') != MODEL_VERSION:
+            raise ReportError(f"Erro: versão de modelo não suportada ({header.get('version')}).")
+        for line in f:
+            if line.strip():
+                record = TestRecord.from_row(json.loads(line))
+                yield record.number, record
+
+def load_model(source):
+    return dict(iter_model(source))
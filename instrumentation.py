@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource # Indisponível no Windows
+except ImportError:
+    resource = None
+
+# ==========================================
+# INSTRUMENTAÇÃO POR ETAPA
+# ==========================================
+# GenerationMetrics mede tempo de parede, tempo de CPU e pico de memória de cada etapa
+# (leitura, cabeçalho, páginas, gravação) e conta testes, passos, tabelas e runs.
+# Etapas aninhadas contam só o próprio tempo (o tempo das filhas é descontado da mãe).
+# Hooks recebem stage_finished(record) e generation_finished(metrics), se definidos.
+# Memória: com trace_memory, o pico do tracemalloc dentro da etapa; sem ele, quanto o RSS do
+# processo cresceu durante a etapa (rss_delta_mb). O pico de RSS do processo (ru_maxrss) vale
+# para a vida toda do processo e aparece só no total da geração, não por etapa.
+
+METRICS_LOGGER = 'geradordereports.metrics'
+
+def _peak_rss_mb():
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024 # bytes no macOS, KB no Linux
+
+_statm = None # (pid, fd) de /proc/self/statm; reaberto em processos filhos (fork)
+_PAGE_MB = os.sysconf('SC_PAGE_SIZE') / 1024 / 1024 if os.path.exists('/proc/self/statm') else None
+
+def _current_rss_mb():
+    # RSS atual (só Linux); chamado a cada teste no timed_iter, por isso pread num fd já aberto
+    global _statm
+    if _PAGE_MB is None: return None
+    pid = os.getpid()
+    if _statm is None or _statm[0] != pid:
+        _statm = (pid, os.open('/proc/self/statm', os.O_RDONLY))
+    return int(os.pread(_statm[1], 128, 0).split()[1]) * _PAGE_MB
+
+class StageRecord:
+    __slots__ = ('name', 'wall', 'cpu', 'peak_mb', 'rss_delta_mb', 'calls')
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_mb = None
+        self.rss_delta_mb = None
+        self.calls = 0
+
+    def as_dict(self):
+        return {"stage": self.name, "wall_s": round(self.wall, 4), "cpu_s": round(self.cpu, 4),
+                "peak_mb": None if self.peak_mb is None else round(self.peak_mb, 2),
+                "rss_delta_mb": None if self.rss_delta_mb is None else round(self.rss_delta_mb, 2), "calls": self.calls}
+
+class GenerationMetrics:
+    # trace_memory=True usa tracemalloc (pico por etapa, mais lento); senão, o crescimento do RSS na etapa.
+    # O RSS é do processo todo: com jobs simultâneos no mesmo processo, inclui o que os outros alocaram.
+    def __init__(self, hooks=(), trace_memory=False, **context):
+        self.hooks = list(hooks)
+        self.context = context
+        self.stages = {}
+        self.counts = {}
+        self.expected = {}
+        self.trace_memory = trace_memory
+        self._stack = []
+        self._started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self.total_wall = None
+        self.total_cpu = None
+        self.process_peak_rss_mb = None
+
+    def _traced_peak_mb(self):
+        return tracemalloc.get_traced_memory()[1] / 1e6
+
+    @contextmanager
+    def _measure(self, name):
+        if self.trace_memory:
+            if self._stack: self._stack[-1]['peak'] = max(self._stack[-1]['peak'], self._traced_peak_mb())
+            tracemalloc.reset_peak()
+        frame = {'child_wall': 0.0, 'child_cpu': 0.0, 'peak': 0.0}
+        self._stack.append(frame)
+        rss0 = None if self.trace_memory else _current_rss_mb()
+        wall0 = time.perf_counter(); cpu0 = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall0; cpu = time.process_time() - cpu0
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]['child_wall'] += wall; self._stack[-1]['child_cpu'] += cpu
+            record = self.stages.get(name)
+            if record is None: record = self.stages[name] = StageRecord(name)
+            record.wall += wall - frame['child_wall']
+            record.cpu += cpu - frame['child_cpu']
+            record.calls += 1
+            if self.trace_memory:
+                peak = max(frame['peak'], self._traced_peak_mb())
+                if self._stack: self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+                record.peak_mb = max(record.peak_mb or 0.0, peak)
+            elif rss0 is not None:
+                record.rss_delta_mb = max(record.rss_delta_mb or 0.0, _current_rss_mb() - rss0)
+
+    def _notify_stage(self, name):
+        for hook in self.hooks:
+            if hasattr(hook, 'stage_finished'): hook.stage_finished(self.stages[name])
+
+    @contextmanager
+    def stage(self, name):
+        with self._measure(name):
+            yield
+        self._notify_stage(name)
+
+    def timed_iter(self, name, iterable):
+        # Mede o tempo gasto produzindo cada item (ex.: leitura em fluxo intercalada com a renderização)
+        it = iter(iterable)
+        while True:
+            with self._measure(name):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+            yield item
+        self._notify_stage(name)
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def expect(self, name, total):
+        # Total previsto de uma contagem (ex.: testes), conhecido antes da renderização; usado no progresso
+        self.expected[name] = total
+
+    def reset_counts(self):
+        self.counts.clear()
+
+    def finish(self, **extra):
+        self.total_wall = time.perf_counter() - self._wall0
+        self.total_cpu = time.process_time() - self._cpu0
+        self.context.update(extra)
+        self.process_peak_rss_mb = _peak_rss_mb() # Medido aqui: o job pode ter rodado em outro processo
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return self.notify_finished()
+
+    def notify_finished(self):
+        # Chamado sozinho quando a geração terminou em outro processo e os hooks estão neste
+        for hook in self.hooks:
+            if hasattr(hook, 'generation_finished'): hook.generation_finished(self)
+        return self
+
+    def as_rows(self):
+        return [record.as_dict() for record in self.stages.values()]
+
+    def as_dict(self):
+        return {
+            **self.context,
+            "total_wall_s": None if self.total_wall is None else round(self.total_wall, 4),
+            "total_cpu_s": None if self.total_cpu is None else round(self.total_cpu, 4),
+            "memory": "tracemalloc" if self.trace_memory else "rss",
+            # Pico da vida do processo (o do job, quando ele roda num processo próprio), não desta geração
+            "process_peak_rss_mb": _peak_rss_mb() if self.total_wall is None else self.process_peak_rss_mb,
+            "stages": self.as_rows(),
+            "counts": dict(self.counts),
+            "expected": dict(self.expected)
+        }
+
+class NullMetrics:
+    # Mesma interface, sem medir nada (padrão quando ninguém pediu métricas)
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def timed_iter(self, name, iterable):
+        return iterable
+
+    def count(self, name, amount=1):
+        pass
+
+    def expect(self, name, total):
+        pass
+
+    def reset_counts(self):
+        pass
+
+NULL_METRICS = NullMetrics()
+
+class JsonLogHook:
+    # Uma linha JSON por geração no logger 'geradordereports.metrics' (stderr se não houver handler)
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(METRICS_LOGGER)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+
+    def generation_finished(self, metrics):
+        self.logger.info(json.dumps({"event": "report_generated", "ts": time.time(), **metrics.as_dict()}, default=str))
+
+def count_xml(metrics, fragment):
+    # Tabelas e runs de um fragmento já serializado do document.xml
+    metrics.count('tables', fragment.count(b'<w:tbl>'))
+    metrics.count('runs', fragment.count(b'<w:r>'))
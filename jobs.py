@@ -0,0 +1,271 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from cache import generate_cached_docx, read_source_bytes
+from instrumentation import GenerationMetrics
+from parallel_render import process_context
+from report_core import ReportError, write_docx
+
+# ==========================================
+# FILA DE GERAÇÃO EM SEGUNDO PLANO
+# ==========================================
+# Cada pedido vira um Job executado por um pool limitado de workers, fora do script do
+# Streamlit: o envio devolve o id na hora e a página só acompanha o progresso (testes
+# renderizados / total). O DOCX pronto fica guardado até o download (ou até expirar).
+# Limites: workers simultâneos, jobs ativos no total e jobs ativos por sessão.
+# Um job executa uma tarefa task(data, cfg, metrics, file_name) -> (bytes do arquivo, detalhes); o padrão
+# é o DOCX de uma aba via cache (cached_task), mas qualquer gerador pode ser enfileirado.
+# Por padrão a tarefa roda num processo próprio (forkserver, ver parallel_render.process_context):
+# a leitura e a formatação não disputam o GIL com o servidor, e os pools de renderização paralela
+# são criados a partir de um processo sem as threads do Streamlit. Uma thread por job só
+# acompanha o processo: o progresso volta por uma fila do Manager e o cancelamento vai por um
+# Event do Manager. A tarefa e seus argumentos precisam ser serializáveis (funções do módulo
+# ou partial delas); cada processo de job tem o seu cache.default_cache.
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+DEFAULT_JOB_WORKERS = int(os.environ.get('REPORT_JOB_WORKERS', 2))
+PROGRESS_INTERVAL = 0.1 # Segundos entre envios de progresso / consultas de cancelamento
+
+class JobCancelled(Exception):
+    pass
+
+class QueueFullError(ReportError):
+    pass
+
+def _cached_job(writer, cache, data, cfg, metrics, file_name=None):
+    buffer, origin = generate_cached_docx(data, cfg, writer=writer, cache=cache, metrics=metrics, file_name=file_name)
+    return buffer.getvalue(), {'cache': origin}
+
+def cached_task(writer=write_docx, cache=None):
+    return partial(_cached_job, writer, cache)
+
+class Job:
+    def __init__(self, job_id, owner, file_name, cfg, output_name, cancel_event=None):
+        self.id = job_id
+        self.owner = owner
+        self.file_name = file_name
+        self.cfg = cfg
+        self.output_name = output_name
+        self.state = QUEUED
+        self.total_tests = None
+        self.done_tests = 0
+        self.result = None
+        self.details = {}
+        self.error = None
+        self.metrics = None
+        self.future = None
+        self.created = time.time()
+        self.finished = None
+        self.cancel_event = cancel_event or threading.Event()
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+    @property
+    def progress(self):
+        if self.state == DONE: return 1.0
+        if not self.total_tests: return 0.0
+        return min(self.done_tests / self.total_tests, 1.0)
+
+class JobProgress:
+    # Recebe as mensagens de progresso da tarefa no servidor: ('total' | 'done', n) atualizam
+    # o job; ('stage', registro) repassa a etapa terminada aos hooks
+    def __init__(self, job, hooks=()):
+        self.job = job
+        self.hooks = list(hooks)
+
+    def put(self, message):
+        kind, value = message
+        if kind == 'total': self.job.total_tests = value
+        elif kind == 'done': self.job.done_tests = value
+        else:
+            for hook in self.hooks:
+                if hasattr(hook, 'stage_finished'): hook.stage_finished(value)
+
+class ProgressMetrics(GenerationMetrics):
+    # Métricas da tarefa: manda a contagem de testes para progress (JobProgress ou fila do Manager)
+    # e interrompe a geração assim que cancel_event é marcado. Com o job em outro processo, cada
+    # acesso ao Manager é uma ida e volta, por isso os dois ficam limitados a um por PROGRESS_INTERVAL.
+    def __init__(self, progress, cancel_event, **kwargs):
+        super().__init__(**kwargs)
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self._last_check = 0.0
+
+    def check_cancelled(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_check < PROGRESS_INTERVAL: return
+        self._last_check = now
+        if 'tests' in self.counts: self.progress.put(('done', self.counts['tests']))
+        if self.cancel_event.is_set(): raise JobCancelled(self.context.get('job_id'))
+
+    def stage(self, name):
+        self.check_cancelled(force=True)
+        return super().stage(name)
+
+    def _notify_stage(self, name):
+        self.progress.put(('stage', self.stages[name]))
+
+    def expect(self, name, total):
+        super().expect(name, total)
+        if name == 'tests': self.progress.put(('total', total))
+
+    def count(self, name, amount=1):
+        super().count(name, amount)
+        self.check_cancelled()
+
+def run_task(task, data, cfg, file_name, progress, cancel_event, context):
+    # Executa a tarefa (no processo do job ou na thread) e devolve (estado, resultado, detalhes,
+    # erro, métricas). As métricas voltam sem hooks: o log é emitido no servidor (JobManager._run).
+    metrics = ProgressMetrics(progress, cancel_event, **context)
+    state, result, details, error = FAILED, None, {}, None
+    try:
+        result, details = task(data, cfg, metrics, file_name)
+        state = DONE
+    except JobCancelled:
+        state = CANCELLED
+    except ReportError as e:
+        error = str(e)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    metrics.progress = metrics.cancel_event = None # Proxies do Manager não voltam ao servidor
+    metrics.finish(status=state, error=error, **details)
+    return state, result, details, error, metrics
+
+class JobManager:
+    # ttl: segundos que um job terminado (e seu DOCX) fica disponível se ninguém baixar
+    # processes=False roda as tarefas em threads do próprio servidor (permite um cache em memória
+    # compartilhado e tarefas que não são serializáveis)
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS, max_active=8, max_per_owner=1, ttl=3600, cache=None, processes=True):
+        if processes and cache is not None:
+            raise ValueError("cache só pode ser usado com processes=False: cada processo de job usa o próprio default_cache")
+        self.max_workers = max_workers
+        self.max_active = max_active
+        self.max_per_owner = max_per_owner
+        self.ttl = ttl
+        self.cache = cache
+        self.processes = processes
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report-job')
+        self._process_pool = None
+        self._manager = None # Criados no primeiro envio: o Manager é um processo
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _start_processes(self):
+        # Chamado com self._lock
+        if self._manager is None: self._manager = process_context().Manager()
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=process_context())
+
+    def submit(self, source, cfg, writer=write_docx, owner=None, file_name=None, hooks=(), task=None,
+               output_name="test_report_professional.docx"):
+        # Lê o arquivo já no envio: o UploadedFile do Streamlit não sobrevive à sessão
+        data = read_source_bytes(source)
+        with self._lock:
+            self._expire()
+            active = [job for job in self._jobs.values() if job.active]
+            if owner is not None and sum(job.owner == owner for job in active) >= self.max_per_owner:
+                raise QueueFullError("Já existe um relatório em geração para esta sessão. Aguarde ou cancele antes de enviar outro.")
+            if len(active) >= self.max_active:
+                raise QueueFullError("A fila de geração está cheia no momento. Tente novamente em alguns minutos.")
+            if self.processes: self._start_processes()
+            cancel_event = self._manager.Event() if self.processes else None
+            job = Job(uuid.uuid4().hex, owner, file_name, dict(cfg), output_name, cancel_event)
+            self._jobs[job.id] = job
+            job.future = self._pool.submit(self._run, job, data, task or cached_task(writer, self.cache), hooks)
+        return job.id
+
+    def _run_in_process(self, job, data, task, progress, context):
+        # A thread do job só repassa as mensagens da fila até o processo terminar
+        messages = self._manager.Queue()
+        future = self._process_pool.submit(run_task, task, data, job.cfg, job.file_name, messages, job.cancel_event, context)
+        while True:
+            try:
+                progress.put(messages.get(timeout=PROGRESS_INTERVAL))
+            except queue.Empty:
+                if future.done(): return future.result()
+
+    def _run(self, job, data, task, hooks):
+        if job.cancel_event.is_set():
+            job.state, job.finished = CANCELLED, time.time()
+            return
+        job.state = RUNNING
+        context = dict(job_id=job.id, file_name=job.file_name, file_bytes=len(data), sheet=job.cfg.get('sheet_target', '0'))
+        progress = JobProgress(job, hooks)
+        state, result, details, metrics = FAILED, None, {}, None
+        try:
+            if self.processes:
+                state, result, details, job.error, metrics = self._run_in_process(job, data, task, progress, context)
+            else:
+                state, result, details, job.error, metrics = run_task(task, data, job.cfg, job.file_name, progress, job.cancel_event, context)
+        except BrokenProcessPool as e:
+            # Processo do job morto (ex.: sem memória): o pool não aceita mais tarefas e é recriado
+            job.error = f"{type(e).__name__}: {e}"
+            with self._lock:
+                self._process_pool.shutdown(wait=False)
+                self._process_pool = None
+                self._start_processes()
+        except Exception as e:
+            # Tarefa não serializável, Manager fora do ar...
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            # Uma linha de log por geração, inclusive as que falharam ou foram canceladas.
+            # O estado só muda depois: a página lê as métricas assim que vê o job terminado.
+            try:
+                if metrics is None:
+                    metrics = GenerationMetrics(hooks, **context).finish(status=state, error=job.error)
+                else:
+                    metrics.hooks = list(hooks)
+                    metrics.notify_finished()
+            finally:
+                job.metrics = metrics
+                job.result, job.details, job.finished, job.state = result, details, time.time(), state
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job_id):
+        # 1 = próximo a rodar; None se não estiver na fila
+        with self._lock:
+            queued = [job for job in self._jobs.values() if job.state == QUEUED]
+        ids = [job.id for job in sorted(queued, key=lambda job: job.created)]
+        return ids.index(job_id) + 1 if job_id in ids else None
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or not job.active: return False
+        job.cancel_event.set()
+        if job.future.cancel(): # Ainda na fila: nem chega a rodar
+            job.state, job.finished = CANCELLED, time.time()
+        return True
+
+    def discard(self, job_id):
+        # Libera o DOCX guardado (chamado após o download)
+        self.cancel(job_id)
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [j.id for j in self._jobs.values() if j.finished and now - j.finished > self.ttl]:
+            del self._jobs[job_id]
+
+    def shutdown(self, cancel=True):
+        if cancel:
+            for job_id in list(self._jobs): self.cancel(job_id)
+        self._pool.shutdown(wait=True)
+        if self._process_pool is not None: self._process_pool.shutdown(wait=True)
+        if self._manager is not None: self._manager.shutdown()
+
+# Fila do processo: no Streamlit o módulo é importado uma vez e atende todas as sessões
+default_jobs = JobManager()
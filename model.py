@@ -0,0 +1,129 @@
+import gzip
+import io
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+import pandas as pd
+
+# ==========================================
+# MODELO INTERMEDIÁRIO (TESTES JÁ LIMPOS)
+# ==========================================
+# Cada teste vira um TestRecord (com __slots__) e cada passo um TestStep, com os textos já
+# convertidos na ingestão exatamente como aparecem no documento: a renderização só lê
+# strings, sem pandas, NaN ou tipos numpy. Textos repetidos (seção, testemunha, etc.) são
+# internados para economizar memória em programas de testes grandes.
+# O modelo pode ser salvo em JSON Lines (opcionalmente .gz) e renderizado depois sem reler o Excel.
+
+MODEL_FORMAT = 'geradordereports.model'
+MODEL_VERSION = 1
+MODEL_SUFFIXES = ('.jsonl', '.jsonl.gz')
+
+def _display(value):
+    # Mesma conversão que a renderização fazia com str(...)
+    return str(value)
+
+def _missing(value, strip=True):
+    if pd.isna(value): return True
+    text = str(value).strip() if strip else str(value)
+    return text.lower() == 'nan'
+
+class TestStep:
+    __slots__ = ('text', 'expected', 'result', 'comment')
+
+    # result/comment: None quando a célula está vazia (o resultado vazio é omitido no documento)
+    def __init__(self, text, expected, result=None, comment=None):
+        self.text = text
+        self.expected = expected
+        self.result = result
+        self.comment = comment
+
+    def to_row(self):
+        return [self.text, self.expected, self.result, self.comment]
+
+class TestRecord:
+    __slots__ = ('number', 'title', 'method', 'section', 'objective', 'fmea_reference', 'sub_system', 'witness', 'date', 'steps')
+
+    def __init__(self, number, title, method, section, objective, fmea_reference, sub_system, witness, date, steps):
+        self.number = number
+        self.title = title
+        self.method = method
+        self.section = section
+        self.objective = objective
+        self.fmea_reference = fmea_reference
+        self.sub_system = sub_system
+        self.witness = witness
+        self.date = date
+        self.steps = steps
+
+    @classmethod
+    def from_values(cls, number, test, method, section, objective, fmea_reference, sub_system, witness, date,
+                    steps, expected, results, comments=()):
+        # Valores crus da planilha (NaN, números, datas) -> textos finais. comments: pares (nº do passo, texto)
+        comment_by_step = dict(comments)
+        records = [
+            TestStep(
+                _display(step), _display(exp),
+                None if _missing(res) else str(res).strip(),
+                comment_by_step.get(i + 1)
+            )
+            for i, (step, exp, res) in enumerate(zip(steps, expected, results))
+        ]
+        intern = sys.intern
+        return cls(
+            str(number), _display(test), _display(method), intern(_display(section)),
+            _display(objective) if objective else '',
+            intern(_display(fmea_reference)), intern(_display(sub_system)), intern(_display(witness)),
+            intern('-' if _missing(date, strip=False) else str(date).strip()),
+            records
+        )
+
+    def to_row(self):
+        return [self.number, self.title, self.method, self.section, self.objective, self.fmea_reference,
+                self.sub_system, self.witness, self.date, [step.to_row() for step in self.steps]]
+
+    @classmethod
+    def from_row(cls, row):
+        *fields, steps = row
+        intern = sys.intern
+        number, title, method, section, objective, fmea_reference, sub_system, witness, date = fields
+        return cls(number, title, method, intern(section), objective, intern(fmea_reference), intern(sub_system),
+                   intern(witness), intern(date), [TestStep(*step) for step in steps])
+
+    def __eq__(self, other):
+        return isinstance(other, TestRecord) and self.to_row() == other.to_row()
+
+    def __repr__(self):
+        return f"TestRecord({self.number!r}, {self.title!r}, steps={len(self.steps)})"
+
+# ==========================================
+# SERIALIZAÇÃO (JSON LINES)
+# ==========================================
+# Primeira linha: cabeçalho {"format", "version", "tests", ...}; depois um array JSON por teste.
+
+def is_model_path(path):
+    return str(path).lower().endswith(MODEL_SUFFIXES)
+
+@contextmanager
+def open_model_file(target, mode):
+    # Caminho (.gz comprimido) ou arquivo binário já aberto (que continua aberto ao final)
+    if isinstance(target, (str, os.PathLike)):
+        opener = gzip.open if str(target).lower().endswith('.gz') else open
+        with opener(target, mode + 't', encoding='utf-8') as f:
+            yield f
+        return
+    f = io.TextIOWrapper(target, encoding='utf-8')
+    try:
+        yield f
+    finally:
+        f.flush()
+        f.detach()
+
+def save_model(grouped_tests, target, **meta):
+    header = {"format": MODEL_FORMAT, "version": MODEL_VERSION, "tests": len(grouped_tests), **meta}
+    with open_model_file(target, 'w') as f:
+        f.write(json.dumps(header, ensure_ascii=False, default=str) + '\n')
+        for record in grouped_tests.values():
+            f.write(json.dumps(record.to_row(), ensure_ascii=False, separators=(',', ':')) + '\n')
+    return target
@@ -0,0 +1,117 @@
+import io
+import re
+import zipfile
+from contextlib import closing
+from functools import partial
+
+from instrumentation import NULL_METRICS
+from report_core import ReportError, detect_format, group_tests, iter_test_pages, named_stream, read_workbook_sheets
+from stream_writer import FragmentRenderer, render_shell, write_docx_from_fragments, write_output, write_streaming_docx
+from parallel_render import count_chunks, map_in_processes, render_chunk, split_pages
+
+# ==========================================
+# VÁRIAS ABAS NUMA ÚNICA LEITURA
+# ==========================================
+# A planilha é aberta uma vez; cada aba com as colunas obrigatórias vira um apêndice.
+# Abas sem as colunas obrigatórias (ou inexistentes) são puladas e informadas ao usuário.
+# Saída: um .zip com um DOCX por aba, ou um DOCX único com um título "APPENDIX B" por aba.
+# A renderização das abas roda em processos separados, como no parallel_render.
+
+MODE_ZIP = 'zip'
+MODE_COMBINED = 'combined'
+
+def parse_sheet_list(text):
+    # "Dados, 2, Trials" -> ['Dados', '2', 'Trials']; vazio -> None (todas as abas)
+    items = [item.strip() for item in str(text or '').split(',')]
+    return [item for item in items if item] or None
+
+def load_sheet_models(source, sheet_vals=None, metrics=NULL_METRICS):
+    # Devolve ({aba: grouped_tests}, {aba: motivo}) na ordem das abas; erro se nenhuma aba serve
+    if detect_format(source) != 'xlsx':
+        raise ReportError("Um apêndice por aba só é possível com planilhas .xlsx (CSV/Parquet têm uma única tabela).")
+    with metrics.stage('read_workbook'):
+        frames, skipped = read_workbook_sheets(source, sheet_vals)
+    models = {}
+    with metrics.stage('grouping'):
+        for name, df in frames.items():
+            tests = group_tests(df)
+            if tests: models[name] = tests
+            else: skipped[name] = "A aba não possui testes (coluna 'test number' vazia)."
+    if not models:
+        details = "; ".join(f"'{name}': {reason}" for name, reason in skipped.items())
+        raise ReportError(f"Nenhuma aba válida para gerar o relatório. {details}")
+    metrics.expect('tests', sum(len(tests) for tests in models.values()))
+    return models, skipped
+
+def docx_name(sheet_name, used=None):
+    # Nome de arquivo seguro e único dentro do zip
+    stem = re.sub(r'[^\w\-. ]+', '_', str(sheet_name)).strip() or 'aba'
+    name = f"{stem}.docx"
+    if used is not None:
+        n = 2
+        while name in used:
+            name = f"{stem} ({n}).docx"; n += 1
+        used.add(name)
+    return name
+
+def render_docx_bytes(grouped_tests, cfg):
+    # Executado no processo filho: DOCX completo (uma aba ou um volume)
+    buffer = io.BytesIO()
+    write_streaming_docx(grouped_tests, cfg, buffer)
+    return buffer.getvalue()
+
+def render_in_processes(fn, items, cfg, workers):
+    if workers == 1 or len(items) <= 1:
+        yield from (fn(item, cfg) for item in items)
+        return
+    yield from map_in_processes(fn, items, cfg, workers)
+
+def write_sheets_zip(models, cfg, fileobj, metrics=NULL_METRICS, workers=None):
+    names = list(models)
+    used = set()
+    documents = render_in_processes(render_docx_bytes, [models[name] for name in names], cfg, workers)
+    with closing(documents), zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_STORED) as zout: # DOCX já é comprimido
+        for name, doc_bytes in zip(names, metrics.timed_iter('create_test_page', documents)):
+            tests = models[name]
+            metrics.count('tests', len(tests)); metrics.count('steps', sum(len(t.steps) for t in tests.values()))
+            with metrics.stage('doc_save'):
+                zout.writestr(docx_name(name, used), doc_bytes)
+    return fileobj
+
+def write_combined_docx(models, cfg, fileobj, metrics=NULL_METRICS, workers=None):
+    # Um documento: cabeçalho e "APPENDIX B" da casca, depois, para cada aba, o nome da aba
+    # como título (em página nova, exceto a primeira) seguido das páginas dos testes.
+    with metrics.stage('create_header'):
+        shell, shell_buffer = render_shell(cfg)
+    renderer = FragmentRenderer(cfg, shell.element)
+
+    chunks, titles = [], {}
+    for name, tests in models.items():
+        titles[len(chunks)] = renderer.render_title(name, page_break=bool(chunks))
+        chunks += split_pages(iter_test_pages(tests), None)
+
+    def _fragments(rendered):
+        for idx, fragment in enumerate(count_chunks(chunks, rendered, metrics)):
+            if idx in titles: yield titles[idx]
+            yield fragment
+
+    with closing(render_in_processes(render_chunk, chunks, cfg, workers)) as rendered:
+        return write_docx_from_fragments(metrics.timed_iter('create_test_page', _fragments(rendered)), shell_buffer, fileobj, metrics)
+
+def write_multi_sheet(models, cfg, fileobj, mode=MODE_ZIP, metrics=NULL_METRICS, workers=None):
+    if mode == MODE_COMBINED: return write_combined_docx(models, cfg, fileobj, metrics, workers=workers)
+    return write_sheets_zip(models, cfg, fileobj, metrics, workers=workers)
+
+def generate_multi_sheet(source, cfg, mode=MODE_ZIP, sheet_vals=None, output_path=None, metrics=NULL_METRICS, workers=None):
+    # Devolve (caminho ou arquivo temporário, {aba pulada: motivo})
+    models, skipped = load_sheet_models(source, sheet_vals, metrics)
+    return write_output(lambda f: write_multi_sheet(models, cfg, f, mode, metrics, workers=workers), output_path), skipped
+
+def _multi_sheet_job(mode, sheet_vals, workers, data, cfg, metrics, file_name=None):
+    models, skipped = load_sheet_models(named_stream(data, file_name), sheet_vals, metrics)
+    buffer = write_multi_sheet(models, cfg, io.BytesIO(), mode, metrics, workers=workers)
+    return buffer.getvalue(), {'sheets': list(models), 'skipped': skipped}
+
+def multi_sheet_task(mode=MODE_ZIP, sheet_vals=None, workers=None):
+    # Tarefa para a fila de jobs (jobs.JobManager.submit(task=...)); partial para poder ir ao processo do job
+    return partial(_multi_sheet_job, mode, sheet_vals, workers)
@@ -0,0 +1,74 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from itertools import repeat
+
+from instrumentation import NULL_METRICS
+from report_core import iter_test_pages, load_tests
+from stream_writer import iter_page_fragments, render_shell, write_docx_from_fragments, write_output
+
+# ==========================================
+# RENDERIZAÇÃO PARALELA COM JUNÇÃO ORDENADA
+# ==========================================
+# Os testes são divididos por seção (ou em blocos de tamanho fixo); cada bloco vira XML do
+# corpo num processo separado e os fragmentos são gravados no document.xml na ordem original.
+# Quebras de página e títulos de seção já vêm decididos por iter_test_pages antes da divisão.
+
+def split_pages(pages, chunk_size=None):
+    # Sem chunk_size: um bloco por seção (a cada título de seção começa um bloco novo)
+    chunks = []
+    for page in pages:
+        if not chunks: starts_chunk = True
+        elif chunk_size: starts_chunk = len(chunks[-1]) >= chunk_size
+        else: starts_chunk = page[2] is not None
+        if starts_chunk: chunks.append([])
+        chunks[-1].append(page)
+    return chunks
+
+def render_chunk(pages, cfg):
+    # Executado no processo filho; render_shell guarda a casca uma vez por processo e estilo
+    return b''.join(iter_page_fragments(pages, cfg, render_shell(cfg)[0].element))
+
+def process_context():
+    # Todo pool de processos do gerador usa forkserver (spawn onde não existe), nunca fork:
+    # o servidor do Streamlit tem várias threads, e um filho criado por fork herda locks
+    # presos por elas e pode travar. O forkserver já vem com o núcleo importado (preload),
+    # então cada filho novo não paga de novo a importação do pandas/python-docx.
+    if 'forkserver' not in multiprocessing.get_all_start_methods(): return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['parallel_render'])
+    return context
+
+def map_in_processes(fn, items, cfg, workers=None):
+    # pool.map devolve os resultados na ordem dos itens, mesmo que terminem fora de ordem.
+    # Se o consumidor parar antes do fim (job cancelado, erro), os itens ainda na fila são
+    # descartados e só os que já estão rodando (um bloco por filho) são esperados: sair do
+    # processo com o pool ainda encerrando deixa os filhos presos esperando a fila.
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=process_context())
+    try:
+        yield from pool.map(fn, items, repeat(cfg))
+    except BaseException:
+        pool.shutdown(cancel_futures=True)
+        raise
+    pool.shutdown()
+
+def count_chunks(chunks, fragments, metrics):
+    # Testes e passos são contados quando o bloco chega renderizado (progresso real)
+    for chunk, fragment in zip(chunks, fragments):
+        metrics.count('tests', len(chunk)); metrics.count('steps', sum(len(page[0].steps) for page in chunk))
+        yield fragment
+
+def write_parallel_docx(grouped_tests, cfg, fileobj, metrics=NULL_METRICS, workers=None, chunk_size=None):
+    chunks = split_pages(list(iter_test_pages(grouped_tests)), chunk_size)
+    with metrics.stage('create_header'):
+        _, shell_buffer = render_shell(cfg)
+    if workers == 1 or len(chunks) <= 1:
+        fragments = count_chunks(chunks, (render_chunk(chunk, cfg) for chunk in chunks), metrics)
+        return write_docx_from_fragments(metrics.timed_iter('create_test_page', fragments), shell_buffer, fileobj, metrics)
+    with closing(map_in_processes(render_chunk, chunks, cfg, workers)) as rendered:
+        fragments = count_chunks(chunks, rendered, metrics)
+        return write_docx_from_fragments(metrics.timed_iter('create_test_page', fragments), shell_buffer, fileobj, metrics)
+
+def generate_parallel_docx(source, cfg, output_path=None, metrics=NULL_METRICS, workers=None, chunk_size=None):
+    tests = load_tests(source, cfg.get('sheet_target', '0'), metrics)
+    return write_output(lambda f: write_parallel_docx(tests, cfg, f, metrics, workers=workers, chunk_size=chunk_size), output_path)
@@ -0,0 +1,512 @@
+import re
+import os
+import io
+from copy import deepcopy
+from docx import Document
+from docx.shared import Pt, Inches, RGBColor
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from assets import BASE_DIR, LOGO_PATH, LOGO_WIDTH_IN, print_logo
+from instrumentation import NULL_METRICS
+from ingest import (
+    REQUIRED_COLS, USED_COLS, ReportError, NonContiguousTestsError,
+    parse_sheet_target, iter_sheet_rows, read_workbook, read_workbook_sheets, iter_workbook_tests, group_tests,
+    iter_model, load_model, detect_format, named_stream, source_name
+)
+
+# ==========================================
+# CONSTANTES GERAIS
+# ==========================================
+COLOR_PRIMARY = "1F4E79"
+COLOR_BORDER  = "BFBFBF"
+COLOR_BG_UNIFIED = "F2F2F2"
+COLOR_TEXT_MAIN = RGBColor(0x26, 0x26, 0x26)
+COLOR_TEXT_LABEL = RGBColor(0x1F, 0x4E, 0x79)
+COLOR_TEXT_PLACEHOLDER = RGBColor(89, 89, 89)
+
+# Configuração padrão (mesmos valores iniciais da barra lateral do Streamlit)
+DEFAULT_STYLE_CONFIG = {
+    "font_name": "Raleway",
+    "h1": 20,
+    "h2": 16,
+    "body": 10,
+    "small": 9,
+    "margins": (1.0, 0.8, 0.5, 0.5),
+    "sheet_target": "0"
+}
+
+# Estilos nomeados, registrados uma vez por documento a partir do STYLE_CONFIG.
+# Os runs apenas referenciam o estilo em vez de repetir fonte, tamanho e cor.
+STYLE_LABEL = "Report Label"
+STYLE_BODY = "Report Body"
+STYLE_SMALL = "Report Small"
+STYLE_PLACEHOLDER = "Report Placeholder"
+STYLE_HEADER_WHITE = "Report Header White"
+STYLE_TEST_HEADER = "Report Test Header"
+STYLE_SECTION_TITLE = "Report Section Title"
+STYLE_MAIN_TITLE = "Report Title"
+
+refined_border = {"sz": 8, "val": "single", "color": COLOR_BORDER}
+box_border_settings = {
+    "top": refined_border, "bottom": refined_border, "left": refined_border, "right": refined_border
+}
+no_border = {
+    "top": {"sz": 0, "val": "nil", "color": "auto"},
+    "bottom": {"sz": 0, "val": "nil", "color": "auto"},
+    "left": {"sz": 0, "val": "nil", "color": "auto"},
+    "right": {"sz": 0, "val": "nil", "color": "auto"},
+    "insideV": {"sz": 0, "val": "nil", "color": "auto"}
+}
+
+# ==========================================
+# FUNÇÕES WORD
+# ==========================================
+
+def set_cell_border_and_shading(cell, border_settings=None, shading_color=None):
+    tc = cell._tc
+    tcPr = tc.get_or_add_tcPr()
+    for element in tcPr.xpath('./w:tcBorders'): tcPr.remove(element)
+
+    if border_settings:
+        tcBorders = OxmlElement('w:tcBorders')
+        for edge, data in border_settings.items():
+            element = OxmlElement(f"w:{edge}")
+            for key, value in data.items(): element.set(qn(f"w:{key}"), str(value))
+            tcBorders.append(element)
+        tcPr.append(tcBorders)
+
+    for element in tcPr.xpath('./w:shd'): tcPr.remove(element)
+    if shading_color:
+        shd = OxmlElement('w:shd')
+        shd.set(qn('w:val'), 'clear')
+        shd.set(qn('w:fill'), shading_color)
+        tcPr.append(shd)
+
+def set_cell_margins(cell, **kwargs):
+    tc = cell._tc
+    tcPr = tc.get_or_add_tcPr()
+    tcMar = OxmlElement('w:tcMar')
+    for edge, value in kwargs.items():
+        mar = OxmlElement(f'w:{edge}')
+        mar.set(qn('w:w'), str(value)); mar.set(qn('w:type'), 'dxa')
+        tcMar.append(mar)
+    tcPr.append(tcMar)
+
+def set_table_indent(table, indent_val=0):
+    tblPr = table._tbl.tblPr
+    if tblPr is None:
+        tblPr = OxmlElement('w:tblPr')
+        table._tbl.insert(0, tblPr)
+    layout = OxmlElement('w:tblLayout'); layout.set(qn('w:type'), 'fixed')
+    for el in tblPr.xpath("w:tblLayout"): tblPr.remove(el)
+    tblPr.append(layout)
+    for element in tblPr.xpath('./w:tblCellSpacing'): tblPr.remove(element)
+    tblCellSpacing = OxmlElement('w:tblCellSpacing'); tblCellSpacing.set(qn('w:w'), "0"); tblCellSpacing.set(qn('w:type'), "dxa")
+    tblPr.append(tblCellSpacing)
+    for el in tblPr.xpath("w:tblInd"): tblPr.remove(el)
+    tblInd = OxmlElement('w:tblInd'); tblInd.set(qn('w:w'), str(indent_val)); tblInd.set(qn('w:type'), 'dxa')
+    tblPr.append(tblInd)
+
+def create_header(doc, image_path):
+    section = doc.sections[0]
+    section.header_distance = Inches(0.2)
+    header = section.header
+    for paragraph in header.paragraphs:
+        p_element = paragraph._element
+        p_element.getparent().remove(p_element)
+    p_logo = header.add_paragraph()
+    p_logo.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
+    p_logo.paragraph_format.left_indent = Inches(-0.09)
+    logo = print_logo(image_path) # Já redimensionado e otimizado, processado uma vez
+    if logo is not None:
+        run_logo = p_logo.add_run()
+        picture = run_logo.add_picture(io.BytesIO(logo), width=Inches(LOGO_WIDTH_IN))
+        # Mesmo nome que add_picture(caminho) gravaria no XML
+        picture._inline.graphic.graphicData.pic.nvPicPr.cNvPr.set('name', os.path.basename(image_path))
+    else:
+        run_logo = p_logo.add_run("[LOGO NÃO ENCONTRADO - Verifique repositório]")
+        run_logo.font.color.rgb = RGBColor(255, 0, 0); run_logo.font.size = Pt(8)
+
+def register_styles(doc, cfg):
+    styles = doc.styles
+
+    def _character(name, size, color, bold=None, italic=None):
+        style = styles.add_style(name, WD_STYLE_TYPE.CHARACTER)
+        style.font.name = cfg['font_name']; style.font.size = Pt(size); style.font.color.rgb = color
+        if bold is not None: style.font.bold = bold
+        if italic is not None: style.font.italic = italic
+
+    def _paragraph(name, size, space_before, space_after):
+        style = styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = styles['Normal']
+        style.font.name = cfg['font_name']; style.font.size = Pt(size)
+        style.font.color.rgb = RGBColor(0, 0, 0); style.font.bold = True
+        style.paragraph_format.space_before = Pt(space_before); style.paragraph_format.space_after = Pt(space_after)
+
+    _character(STYLE_LABEL, cfg['small'], COLOR_TEXT_LABEL, bold=True)
+    _character(STYLE_BODY, cfg['body'], COLOR_TEXT_MAIN)
+    _character(STYLE_SMALL, cfg['small'], COLOR_TEXT_MAIN)
+    _character(STYLE_PLACEHOLDER, cfg['small'], COLOR_TEXT_PLACEHOLDER, italic=True)
+    _character(STYLE_HEADER_WHITE, cfg['small'], RGBColor(255, 255, 255), bold=True)
+    _character(STYLE_TEST_HEADER, cfg['small'] + 1, RGBColor(255, 255, 255), bold=True)
+    _paragraph(STYLE_SECTION_TITLE, cfg['h2'], 6, 14)
+    _paragraph(STYLE_MAIN_TITLE, cfg['h1'], 0, 24)
+
+def _format_run(run, kind):
+    # Estilo de cada tipo de run usado nas caixas de detalhes
+    if kind == 'label':
+        run.style = STYLE_LABEL
+    elif kind == 'number': # "1. " no início da linha e "Step N: " nos comentários
+        run.style = STYLE_BODY; run.bold = True
+    elif kind in ('text', 'line', 'break'):
+        run.style = STYLE_BODY
+    elif kind in ('placeholder', 'comment_placeholder'):
+        run.style = STYLE_PLACEHOLDER
+    # 'plain_break': quebra sem formatação
+
+def _add_section_title(doc, section_title, cfg):
+    p_sec = doc.add_paragraph(style=STYLE_SECTION_TITLE)
+    p_sec.add_run(str(section_title))
+    return p_sec
+
+def _add_gap_paragraph(doc):
+    # "Ghost paragraph" de 1pt: evita que o Word funda as tabelas, sem espaço visual branco.
+    p_gap = doc.add_paragraph()
+    p_gap.paragraph_format.space_before = Pt(0)
+    p_gap.paragraph_format.space_after = Pt(0)
+    p_gap.paragraph_format.line_spacing = Pt(1) # Linha minúscula
+    p_gap.add_run().font.size = Pt(1) # Fonte minúscula
+    return p_gap
+
+def _add_blue_header(doc, test_title, cfg):
+    table_blue = doc.add_table(rows=1, cols=2); table_blue.width = Inches(7.5); table_blue.allow_autofit = False
+    set_table_indent(table_blue, indent_val=-10)
+    table_blue.columns[0].width = Inches(0.8); table_blue.columns[1].width = Inches(6.7)
+    
+    cell_lbl = table_blue.cell(0, 0); cell_val = table_blue.cell(0, 1)
+    set_cell_margins(cell_lbl, top=60, bottom=60, left=100, right=100)
+    set_cell_margins(cell_val, top=60, bottom=60, left=100, right=100)
+
+    cell_lbl.paragraphs[0].add_run("TEST NO:", style=STYLE_TEST_HEADER)
+    cell_val.paragraphs[0].add_run(test_title, style=STYLE_TEST_HEADER)
+
+    set_cell_border_and_shading(cell_lbl, border_settings=no_border, shading_color=COLOR_PRIMARY)
+    set_cell_border_and_shading(cell_val, border_settings=no_border, shading_color=COLOR_PRIMARY)
+    return table_blue
+
+def _add_fmea_table(doc, fmea_reference, sub_system, cfg):
+    table_info = doc.add_table(rows=1, cols=2); table_info.width = Inches(7.49); set_table_indent(table_info, indent_val=0)
+    table_info.columns[0].width = Inches(3.75); table_info.columns[1].width = Inches(3.74)
+    
+    c1 = table_info.cell(0,0); c2 = table_info.cell(0,1)
+    set_cell_margins(c1, top=60, bottom=60, left=100, right=100)
+    set_cell_margins(c2, top=60, bottom=60, left=100, right=100)
+    
+    p1 = c1.paragraphs[0]; r1a = p1.add_run("FMEA Reference: ", style=STYLE_SMALL); r1a.bold = True
+    p1.add_run(fmea_reference, style=STYLE_SMALL)
+    
+    p2 = c2.paragraphs[0]; r2a = p2.add_run("Sub-System: ", style=STYLE_SMALL); r2a.bold = True
+    p2.add_run(sub_system, style=STYLE_SMALL)
+
+    set_cell_border_and_shading(c1, border_settings=box_border_settings, shading_color=COLOR_BG_UNIFIED)
+    set_cell_border_and_shading(c2, border_settings=box_border_settings, shading_color=COLOR_BG_UNIFIED)
+    return table_info
+
+def _add_details_table(doc):
+    details_table = doc.add_table(rows=0, cols=1)
+    details_table.width = Inches(7.5)
+    details_table.allow_autofit = False
+    set_table_indent(details_table, indent_val=0)
+    return details_table
+
+def _add_box_row(details_table, label, shading_color, cfg, content_spacing=True):
+    # Linha da caixa de detalhes: rótulo em negrito + parágrafo de conteúdo (ainda vazio)
+    row = details_table.add_row()
+    cell = row.cells[0]; cell.width = Inches(7.5)
+    set_cell_margins(cell, top=80, bottom=80, left=120, right=100)
+    set_cell_border_and_shading(cell, border_settings=box_border_settings, shading_color=shading_color)
+
+    p_label = cell.paragraphs[0]
+    if not p_label.text: p_label.clear()
+    p_label.paragraph_format.space_after = Pt(3)
+    _format_run(p_label.add_run(f"{label}:"), 'label')
+
+    p_content = cell.add_paragraph()
+    if content_spacing: p_content.paragraph_format.space_after = Pt(2)
+    return row
+
+def _add_witness_table(doc, witness, date_v, cfg):
+    table_wit = doc.add_table(rows=1, cols=2); table_wit.width = Inches(7.5); set_table_indent(table_wit, indent_val=-10)
+    table_wit.columns[0].width = Inches(5.0); table_wit.columns[1].width = Inches(2.5)
+    
+    cw = table_wit.cell(0,0); cd = table_wit.cell(0,1)
+    set_cell_margins(cw, top=60, bottom=60, left=100, right=100)
+    set_cell_margins(cd, top=60, bottom=60, left=100, right=100)
+    
+    pw = cw.paragraphs[0]
+    pw.add_run("Witnessed by: ", style=STYLE_HEADER_WHITE); pw.add_run(witness, style=STYLE_HEADER_WHITE)
+    
+    pd_ = cd.paragraphs[0]
+    pd_.add_run("Date: ", style=STYLE_HEADER_WHITE); pd_.add_run(date_v, style=STYLE_HEADER_WHITE)
+        
+    set_cell_border_and_shading(cw, border_settings=no_border, shading_color=COLOR_PRIMARY)
+    set_cell_border_and_shading(cd, border_settings=no_border, shading_color=COLOR_PRIMARY)
+    return table_wit
+
+# ==========================================
+# PROTÓTIPOS DA PÁGINA DE TESTE
+# ==========================================
+# Cada bloco da página (cabeçalho azul, FMEA, detalhes, assinaturas) é montado uma única vez
+# por configuração de estilo com as funções acima. Cada teste clona (deepcopy) o XML pronto
+# e preenche apenas os textos, sem refazer bordas, sombreamento, margens e recuos célula a célula.
+
+BOX_LABELS = ['Objective', 'Method', 'Steps', 'Expected Results', 'Results']
+RUN_KINDS = ['number', 'text', 'line', 'break', 'plain_break', 'placeholder', 'comment_placeholder']
+
+class TestPageTemplate:
+    def __init__(self, cfg):
+        scratch = new_document(cfg)
+        body = scratch.element.body
+
+        self.page_break = scratch.add_page_break()._p
+        self.main_title = scratch.add_paragraph(style=STYLE_MAIN_TITLE)
+        self.main_title.add_run("-")
+        self.main_title = self.main_title._p
+        self.section_title = _add_section_title(scratch, "-", cfg)._p
+        self.blue_header = _add_blue_header(scratch, "-", cfg)._tbl
+        self.gap = _add_gap_paragraph(scratch)._p
+        self.fmea = _add_fmea_table(scratch, "-", "-", cfg)._tbl
+        self.witness = _add_witness_table(scratch, "-", "-", cfg)._tbl
+
+        details_table = _add_details_table(scratch)
+        self.box_rows = {label: _add_box_row(details_table, label, COLOR_BG_UNIFIED, cfg)._tr for label in BOX_LABELS}
+        self.box_rows['Comments'] = _add_box_row(details_table, "Comments", COLOR_BG_UNIFIED, cfg, content_spacing=False)._tr
+        for tr in self.box_rows.values(): details_table._tbl.remove(tr)
+        self.details = details_table._tbl
+
+        p_runs = scratch.add_paragraph()
+        self.runs = {}
+        for kind in RUN_KINDS:
+            run = p_runs.add_run()
+            _format_run(run, kind)
+            self.runs[kind] = run._r
+
+        for el in list(body):
+            if el.tag != qn('w:sectPr'): body.remove(el)
+
+    def _clone(self, proto, *texts):
+        # Copia o protótipo e troca o texto dos runs indicados: texts = ((índice do run, texto), ...)
+        el = deepcopy(proto)
+        if texts:
+            runs = list(el.iter(qn('w:r')))
+            for idx, text in texts: runs[idx].text = text
+        return el
+
+    def _run(self, kind, text):
+        r = deepcopy(self.runs[kind])
+        r.text = text
+        return r
+
+    def _append_lines(self, p_content, content):
+        # Uma linha por item; "1. texto" vira número em negrito + texto. A quebra entre linhas
+        # só recebe fonte/cor quando ainda aparece outra linha com conteúdo depois dela.
+        lines = str(content).split('\n')
+        pending_break = None
+        for i, line in enumerate(lines):
+            line = line.strip()
+            if not line: continue
+            match = re.match(r'^(\d+\.)\s*(.*)', line)
+            if match:
+                p_content.append(self._run('number', match.group(1) + " "))
+                p_content.append(self._run('text', match.group(2)))
+            else:
+                p_content.append(self._run('line', line))
+
+            if pending_break is not None:
+                p_content.replace(pending_break, self._run('break', "\n"))
+                pending_break = None
+            if i < len(lines) - 1:
+                pending_break = self._run('plain_break', "\n")
+                p_content.append(pending_break)
+
+    def _box(self, label, content, is_placeholder=False):
+        tr = deepcopy(self.box_rows[label])
+        p_content = tr.findall('.//' + qn('w:p'))[-1]
+        if is_placeholder: p_content.append(self._run('placeholder', content))
+        else: self._append_lines(p_content, content)
+        return tr
+
+    def _details(self, test):
+        tbl = deepcopy(self.details)
+        if test.objective: tbl.append(self._box("Objective", test.objective))
+        tbl.append(self._box("Method", test.method))
+        tbl.append(self._box("Steps", "\n".join(step.text for step in test.steps)))
+        tbl.append(self._box("Expected Results", "\n".join(step.expected for step in test.steps)))
+
+        results_content = "\n".join(step.result for step in test.steps if step.result is not None)
+        is_ph = False if results_content else True
+        if not results_content: results_content = "No results or comments provided."
+        tbl.append(self._box("Results", results_content, is_placeholder=is_ph))
+
+        comments_list = [(i + 1, step.comment) for i, step in enumerate(test.steps) if step.comment is not None]
+        tr = deepcopy(self.box_rows['Comments'])
+        p_content = tr.findall('.//' + qn('w:p'))[-1]
+        if not comments_list:
+            p_content.append(self._run('comment_placeholder', "No additional comments"))
+        else:
+            for i, (step_number, text) in enumerate(comments_list):
+                p_content.append(self._run('number', f"Step {step_number}: "))
+                p_content.append(self._run('text', text))
+                if i < len(comments_list) - 1: p_content.append(self._run('plain_break', "\n"))
+        tbl.append(tr)
+        return tbl
+
+    def render_blocks(self, test, is_first_test=False, section_title=None, page_break=True):
+        # Elementos (w:p / w:tbl) da página do teste (TestRecord), prontos para entrar no corpo do documento
+        blocks = []
+        if not is_first_test and page_break: blocks.append(self._clone(self.page_break))
+        if section_title: blocks.append(self._clone(self.section_title, (0, section_title)))
+
+        blocks += [
+            self._clone(self.blue_header, (1, test.title)),
+            self._clone(self.gap),
+            self._clone(self.fmea, (1, test.fmea_reference), (3, test.sub_system)),
+            self._details(test),
+            self._clone(self.gap),
+            self._clone(self.witness, (1, test.witness), (3, test.date))
+        ]
+        return blocks
+
+    def render_title(self, title, page_break=True):
+        # Título no estilo do "APPENDIX B" (ex.: início do apêndice de cada aba num documento combinado)
+        blocks = [self._clone(self.page_break)] if page_break else []
+        return blocks + [self._clone(self.main_title, (0, str(title)))]
+
+    def render(self, doc, test_info, is_first_test=False, section_title=None):
+        has_paragraphs = doc.element.body.find(qn('w:p')) is not None
+        append_blocks(doc, self.render_blocks(test_info, is_first_test, section_title, page_break=has_paragraphs))
+
+def append_blocks(doc, blocks):
+    # Insere parágrafos/tabelas no fim do corpo, antes do w:sectPr final
+    body = doc.element.body
+    sectPr = body.sectPr
+    for el in blocks:
+        if sectPr is not None: sectPr.addprevious(el)
+        else: body.append(el)
+
+_TEMPLATE_CACHE = {}
+
+def style_key(cfg):
+    # Somente o que altera a aparência do documento (a aba lida não entra)
+    return (cfg['font_name'], cfg['h1'], cfg['h2'], cfg['body'], cfg['small'], tuple(cfg['margins']))
+
+def get_page_template(cfg):
+    key = style_key(cfg)
+    template = _TEMPLATE_CACHE.get(key)
+    if template is None:
+        if len(_TEMPLATE_CACHE) >= 8: _TEMPLATE_CACHE.clear()
+        template = _TEMPLATE_CACHE[key] = TestPageTemplate(cfg)
+    return template
+
+def create_details_section(doc, test_info, cfg):
+    append_blocks(doc, [get_page_template(cfg)._details(test_info)])
+
+def create_test_page(doc, test_info, cfg, is_first_test=False, section_title=None):
+    get_page_template(cfg).render(doc, test_info, is_first_test=is_first_test, section_title=section_title)
+
+# ==========================================
+# GERAÇÃO DO RELATÓRIO (NÚCLEO SEM STREAMLIT)
+# ==========================================
+
+def new_document(cfg):
+    # Configuração Inicial do Doc
+    doc = Document()
+    normal_style = doc.styles['Normal']
+    normal_style.font.name = cfg['font_name']
+    normal_style.font.size = Pt(cfg['body'])
+    # --- CORREÇÃO CRÍTICA: ZERAR ESPAÇAMENTO PADRÃO ---
+    normal_style.paragraph_format.space_before = Pt(0)
+    normal_style.paragraph_format.space_after = Pt(0) # Evita gaps automáticos do Word
+    normal_style.paragraph_format.line_spacing = 1.15
+    register_styles(doc, cfg)
+
+    section = doc.sections[0]
+    section.top_margin = Inches(cfg['margins'][0])
+    section.bottom_margin = Inches(cfg['margins'][1])
+    section.left_margin = Inches(cfg['margins'][2])
+    section.right_margin = Inches(cfg['margins'][3])
+    section.page_width = Inches(8.5); section.page_height = Inches(11.0)
+    return doc
+
+def iter_test_pages(grouped_tests, metrics=NULL_METRICS):
+    # (test_info, é o primeiro teste?, título da seção quando ela muda) para cada teste, em ordem.
+    # Aceita o dicionário agrupado ou um iterável de pares (test number, test_info) em fluxo.
+    first_iteration = True
+    current_chapter = None
+    tests = grouped_tests.items() if isinstance(grouped_tests, dict) else grouped_tests
+    for _, test_info in tests:
+        metrics.count('tests'); metrics.count('steps', len(test_info.steps))
+        if test_info.section != current_chapter:
+            current_chapter = test_info.section
+            yield test_info, first_iteration, current_chapter
+        else:
+            yield test_info, first_iteration, None
+        first_iteration = False
+
+def read_grouped_tests(source, sheet_val, metrics=NULL_METRICS):
+    # Aba inteira numa tabela e agrupamento colunar (aceita testes em linhas não consecutivas)
+    with metrics.stage('read_workbook'):
+        df = read_workbook(source, sheet_val)
+    with metrics.stage('grouping'):
+        return group_tests(df)
+
+def with_workbook_tests(source, sheet_val, consume, metrics=NULL_METRICS):
+    # consume(tests) recebe os testes em fluxo (pares de iter_workbook_tests); se algum teste
+    # aparece em linhas não consecutivas, começa de novo com o grouped_tests da aba inteira.
+    try:
+        return consume(metrics.timed_iter('read_workbook', iter_workbook_tests(source, sheet_val)))
+    except NonContiguousTestsError:
+        if hasattr(source, 'seek'): source.seek(0)
+        metrics.reset_counts()
+        return consume(read_grouped_tests(source, sheet_val, metrics))
+
+def load_tests(source, sheet_val, metrics=NULL_METRICS):
+    # grouped_tests completo, agrupado em fluxo sempre que possível (sem a tabela inteira na memória)
+    return with_workbook_tests(source, sheet_val, dict, metrics)
+
+def build_document(grouped_tests, cfg, metrics=NULL_METRICS):
+    with metrics.stage('create_header'):
+        doc = new_document(cfg)
+        create_header(doc, LOGO_PATH)
+
+        main_title_para = doc.add_paragraph(style=STYLE_MAIN_TITLE)
+        main_title_para.add_run("APPENDIX B - DP ANNUAL TRIALS TESTS")
+
+    with metrics.stage('create_test_page'):
+        for test_info, is_first_test, section_title in iter_test_pages(grouped_tests, metrics):
+            create_test_page(doc, test_info, cfg, is_first_test=is_first_test, section_title=section_title)
+    count_elements(metrics, doc.element.body)
+    return doc
+
+def count_elements(metrics, body):
+    metrics.count('tables', sum(1 for _ in body.iter(qn('w:tbl'))))
+    metrics.count('runs', sum(1 for _ in body.iter(qn('w:r'))))
+
+def write_docx(grouped_tests, cfg, fileobj, metrics=NULL_METRICS):
+    # Mesma assinatura de stream_writer.write_streaming_docx: monta a árvore inteira e salva
+    doc = build_document(grouped_tests, cfg, metrics)
+    with metrics.stage('doc_save'):
+        doc.save(fileobj)
+    return fileobj
+
+def generate_professional_docx(source, cfg, metrics=NULL_METRICS):
+    # source: caminho, arquivo aberto ou UploadedFile do Streamlit. Lança ReportError em entradas inválidas.
+    doc = with_workbook_tests(source, cfg.get('sheet_target', '0'), lambda tests: build_document(tests, cfg, metrics), metrics)
+
+    buffer = io.BytesIO()
+    with metrics.stage('doc_save'):
+        doc.save(buffer)
+    buffer.seek(0)
+    return buffer
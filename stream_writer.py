@@ -0,0 +1,121 @@
+import io
+import os
+import tempfile
+import zipfile
+from copy import deepcopy
+
+from docx.oxml.ns import qn
+from lxml import etree
+
+from assets import LOGO_PATH, asset_key
+from instrumentation import NULL_METRICS, count_xml
+from report_core import build_document, get_page_template, iter_test_pages, style_key, with_workbook_tests
+
+# ==========================================
+# SAÍDA EM FLUXO (APÊNDICES MUITO GRANDES)
+# ==========================================
+# Em vez de montar o documento inteiro na árvore do python-docx e salvar num BytesIO,
+# o word/document.xml é escrito direto no zip, teste a teste. Cabeçalho, logo, estilos e
+# demais partes vêm de um documento "casca" (sem testes) gerado pelo caminho normal.
+
+DOCUMENT_PART = 'word/document.xml'
+SPOOL_MAX_SIZE = 32 * 1024 * 1024 # Acima disso o SpooledTemporaryFile passa para o disco
+
+class _FragmentSerializer:
+    # Serializa blocos dentro de uma cópia vazia do w:document da casca, para que os
+    # namespaces fiquem declarados na raiz e cada fragmento saia igual ao do doc.save.
+    def __init__(self, shell_root):
+        self.root = deepcopy(shell_root)
+        self.body = self.root.find(qn('w:body'))
+        for el in list(self.body): self.body.remove(el)
+
+    def serialize(self, blocks):
+        for el in blocks: self.body.append(el)
+        xml = etree.tostring(self.root, encoding='UTF-8')
+        for el in list(self.body): self.body.remove(el)
+        return xml[xml.index(b'<w:body>') + len(b'<w:body>'):xml.rindex(b'</w:body>')]
+
+_SHELL_CACHE = {}
+
+def render_shell(cfg):
+    # Documento sem testes (cabeçalho, logo, estilos e título) e o zip salvo dele. A casca é
+    # montada uma vez por estilo (e versão do logo) no processo; cada chamada recebe um buffer
+    # próprio. O documento devolvido é compartilhado: só deve ser lido (deepcopy da raiz).
+    key = (style_key(cfg), asset_key(LOGO_PATH))
+    cached = _SHELL_CACHE.get(key)
+    if cached is None:
+        shell = build_document({}, cfg)
+        shell_buffer = io.BytesIO()
+        shell.save(shell_buffer)
+        if len(_SHELL_CACHE) >= 8: _SHELL_CACHE.clear()
+        cached = _SHELL_CACHE[key] = (shell, shell_buffer.getvalue())
+    return cached[0], io.BytesIO(cached[1])
+
+class FragmentRenderer:
+    # XML do corpo (bytes) de uma página de teste, pronto para entrar no document.xml
+    def __init__(self, cfg, shell_root):
+        self.serializer = _FragmentSerializer(shell_root)
+        self.template = get_page_template(cfg)
+
+    def render(self, test_info, is_first_test=False, section_title=None):
+        return self.serializer.serialize(self.template.render_blocks(test_info, is_first_test, section_title))
+
+    def render_title(self, title, page_break=True):
+        return self.serializer.serialize(self.template.render_title(title, page_break))
+
+def iter_page_fragments(pages, cfg, shell_root):
+    # pages: tuplas (test_info, is_first_test, section_title) de iter_test_pages
+    renderer = FragmentRenderer(cfg, shell_root)
+    for test_info, is_first_test, section_title in pages:
+        yield renderer.render(test_info, is_first_test, section_title)
+
+def write_docx_from_fragments(fragments, shell_buffer, fileobj, metrics=NULL_METRICS):
+    # Copia as partes da casca e monta o word/document.xml com os fragmentos, na ordem recebida
+    shell_xml = zipfile.ZipFile(shell_buffer).read(DOCUMENT_PART)
+    split_at = shell_xml.rindex(b'<w:sectPr')
+
+    with metrics.stage('doc_save'), zipfile.ZipFile(shell_buffer) as zin, zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            if info.filename != DOCUMENT_PART:
+                zout.writestr(info, zin.read(info.filename))
+                continue
+
+            doc_info = zipfile.ZipInfo(DOCUMENT_PART, date_time=info.date_time)
+            doc_info.compress_type = zipfile.ZIP_DEFLATED
+            with zout.open(doc_info, 'w', force_zip64=True) as part:
+                part.write(shell_xml[:split_at]) # Raiz, corpo e título "APPENDIX B"
+                count_xml(metrics, shell_xml[:split_at])
+                for fragment in fragments:
+                    count_xml(metrics, fragment)
+                    part.write(fragment)
+                part.write(shell_xml[split_at:]) # w:sectPr e fechamento
+    return fileobj
+
+def write_streaming_docx(grouped_tests, cfg, fileobj, metrics=NULL_METRICS):
+    # grouped_tests: dicionário agrupado ou iterável de (test number, test_info)
+    with metrics.stage('create_header'):
+        shell, shell_buffer = render_shell(cfg)
+    fragments = iter_page_fragments(iter_test_pages(grouped_tests, metrics), cfg, shell.element)
+    return write_docx_from_fragments(metrics.timed_iter('create_test_page', fragments), shell_buffer, fileobj, metrics)
+
+def write_output(writer, output_path=None):
+    # writer(fileobj) grava o .docx. Com caminho, grava no disco e devolve o caminho;
+    # sem caminho, devolve um SpooledTemporaryFile posicionado no início.
+    target = open(output_path, 'wb') if output_path else tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        writer(target)
+    except BaseException:
+        target.close()
+        if output_path: os.remove(output_path) # Não deixa um .docx pela metade
+        raise
+    if output_path:
+        target.close()
+        return output_path
+    target.seek(0)
+    return target
+
+def generate_streaming_docx(source, cfg, output_path=None, metrics=NULL_METRICS):
+    return with_workbook_tests(
+        source, cfg.get('sheet_target', '0'),
+        lambda tests: write_output(lambda f: write_streaming_docx(tests, cfg, f, metrics), output_path), metrics
+    )
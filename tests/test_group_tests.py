@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import model
+from report_core import REQUIRED_COLS, group_tests
+
+# ==========================================
+# EQUIVALÊNCIA COM O AGRUPAMENTO ORIGINAL (ITERROWS)
+# ==========================================
+# reference_group_tests é o group_tests original, linha a linha com df.iterrows(); o
+# agrupamento colunar tem que produzir os mesmos testes, na mesma ordem e com os mesmos textos.
+
+def reference_group_tests(df):
+    grouped_tests = {}
+    if not df.empty:
+        for _, row in df.iterrows():
+            chapter_title = row.get('Section', 'Section Name')
+            test_number = row.get('test number', '000')
+            if pd.isna(test_number): continue
+
+            if test_number not in grouped_tests:
+                grouped_tests[test_number] = {
+                    'Test': row.get('Test', 'Test Title'), 'Method': row.get('Method', ''), 'Steps': [],
+                    'Expected Results': [], 'Result + Comment': [], 'Step Comments': [],
+                    'Witness 1': row.get('Witness 1', ''), 'Date:': row.get('Date', ''), 'Section': chapter_title,
+                    'FMEA Reference': row.get('FMEA Reference', ''), 'Sub-System': row.get('Sub-System', ''),
+                    'Objective': row.get('Objective', '')
+                }
+            grouped_tests[test_number]['Steps'].append(row.get('Step', ''))
+
+            curr_step = len(grouped_tests[test_number]['Steps'])
+            a_comm = row.get('Auditor FMEA Comment')
+            if pd.notna(a_comm) and str(a_comm).strip():
+                grouped_tests[test_number]['Step Comments'].append({'step': curr_step, 'text': str(a_comm).strip()})
+
+            grouped_tests[test_number]['Expected Results'].append(row.get('Expected Result', ''))
+            grouped_tests[test_number]['Result + Comment'].append(row.get('Result + Comment', ''))
+    return grouped_tests
+
+def reference_records(df):
+    # Dicionários do agrupamento original -> TestRecord, com a mesma limpeza de textos
+    return {
+        number: model.TestRecord.from_values(
+            number, t['Test'], t['Method'], t['Section'], t['Objective'], t['FMEA Reference'], t['Sub-System'],
+            t['Witness 1'], t['Date:'], t['Steps'], t['Expected Results'], t['Result + Comment'],
+            [(c['step'], c['text']) for c in t['Step Comments']]
+        )
+        for number, t in reference_group_tests(df).items()
+    }
+
+def assert_same_grouping(df):
+    expected = reference_records(df)
+    actual = group_tests(df)
+    assert list(actual) == list(expected)
+    assert [t.to_row() for t in actual.values()] == [t.to_row() for t in expected.values()]
+
+def _frame(rows, columns=None):
+    df = pd.DataFrame(rows, dtype=object)
+    return df[columns] if columns else df
+
+FULL_ROW = {
+    'test number': '1', 'Section': 'Power', 'Test': 'Blackout recovery', 'Method': 'Trip bus tie',
+    'Objective': 'Verify recovery', 'FMEA Reference': '4.2', 'Sub-System': 'Switchboard',
+    'Witness 1': 'J. Silva', 'Date': '2025-03-01', 'Step': 'Open breaker', 'Expected Result': 'Standby starts',
+    'Result + Comment': 'OK', 'Auditor FMEA Comment': 'Checked'
+}
+
+def _row(**changes):
+    return {**FULL_ROW, **changes}
+
+def test_nan_and_blank_comments():
+    df = _frame([
+        _row(**{'Auditor FMEA Comment': np.nan}),
+        _row(Step='Close breaker', **{'Auditor FMEA Comment': '   '}),
+        _row(Step='Restore', **{'Auditor FMEA Comment': '  Late start  '}),
+        _row(Step='Report', **{'Auditor FMEA Comment': None, 'Result + Comment': np.nan}),
+    ])
+    assert_same_grouping(df)
+    assert group_tests(df)['1'].steps[2].comment == 'Late start'
+
+def test_non_contiguous_test_numbers():
+    # Linhas de um teste separadas por outro: juntadas no primeiro, na ordem das linhas
+    df = _frame([
+        _row(), _row(**{'test number': '2', 'Test': 'Thruster loss'}),
+        _row(Step='Second step of 1', Section='Other section', **{'Auditor FMEA Comment': 'c'}),
+        _row(**{'test number': '2', 'Step': 'Second step of 2'}),
+    ])
+    assert_same_grouping(df)
+    grouped = group_tests(df)
+    assert [s.text for s in grouped['1'].steps] == ['Open breaker', 'Second step of 1']
+    assert grouped['1'].section == 'Power'
+
+def test_missing_optional_columns():
+    df = _frame([_row(), _row(Step='Next'), _row(**{'test number': '2'})], columns=list(REQUIRED_COLS))
+    assert_same_grouping(df)
+
+def test_missing_test_numbers_and_mixed_types():
+    df = _frame([
+        _row(**{'test number': np.nan}), _row(**{'test number': 3, 'Step': 7, 'Expected Result': 1.5}),
+        _row(**{'test number': 3, 'Date': pd.Timestamp('2025-01-02'), 'Result + Comment': 0}),
+        _row(**{'test number': '3'}), _row(**{'test number': None}),
+    ])
+    assert_same_grouping(df)
+
+@pytest.mark.parametrize('df', [
+    pd.DataFrame(columns=list(REQUIRED_COLS), dtype=object),
+    _frame([_row(**{'test number': np.nan})]),
+])
+def test_no_tests(df):
+    assert group_tests(df) == reference_records(df) == {}
@@ -0,0 +1,112 @@
+import csv
+import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from report_core import (
+    NonContiguousTestsError, group_tests, iter_workbook_tests, load_tests, named_stream, read_workbook
+)
+
+# ==========================================
+# LEITURA DA PLANILHA: MESMOS TESTES QUE O pd.read_excel
+# ==========================================
+# A leitura via openpyxl (read_workbook, iter_workbook_tests) substituiu o
+# pd.read_excel(..., dtype={'test number': str}); células de erro, textos de NA, floats
+# inteiros, datas e cabeçalhos repetidos têm que virar os mesmos testes. As exportações
+# CSV/Parquet dos mesmos dados também.
+
+HEADER = [
+    'test number', 'Section', 'Test', 'Method', 'Step', 'Expected Result', 'Witness 1', 'Date',
+    'Result + Comment', 'Auditor FMEA Comment', 'Step', 'Notes'
+]
+MARCH_1 = datetime.datetime(2025, 3, 1)
+
+ROWS = [
+    ['1', 'Power', 'Blackout recovery', 'Trip bus tie', 'Open breaker', 'Standby starts', 'J. Silva', MARCH_1,
+     'OK', None, 'Coluna repetida', 'x'],
+    [1, 'Power', 'Blackout recovery', 'Trip bus tie', 3.0, '#N/A', 'J. Silva', MARCH_1, 'NA', '  Checked  ', None, None],
+    [2.0, 'Thrusters', 'Thruster loss', None, 'null', '#DIV/0!', None, None, 'n/a', 'NULL', None, None],
+    [None, 'Thrusters', 'Sem número', 'x', 'Ignorada', 'x', None, None, None, None, None, None],
+    ['3', 'Thrusters', 'Drift', 'Manual', 'Step A', 1.5, 'W. Costa', datetime.datetime(2025, 3, 2, 14, 30),
+     '#VALUE!', 'None', None, None],
+    ['3', 'Thrusters', 'Drift', 'Manual', 7, 'Holds position', 'W. Costa', datetime.datetime(2025, 3, 2, 14, 30),
+     'OK', '-', None, None],
+]
+# O teste 1 volta depois dos testes 2 e 3: o agrupamento em fluxo não consegue fechá-lo
+LATE_ROW = ['1', 'Other', 'Outro título', 'x', 'Late step', 'Done', None, None, 'OK', 'late', None, None]
+
+def write_xlsx(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADER)
+    for row in rows: ws.append(row) # '#N/A', '#DIV/0!'... viram células de erro
+    wb.save(path)
+    return path
+
+def _csv_text(value):
+    # Como a exportação do sistema grava cada célula
+    if value is None: return ''
+    if isinstance(value, float) and value.is_integer(): return str(int(value))
+    return str(value)
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows([[_csv_text(value) for value in row] for row in rows])
+    return path
+
+def write_parquet(path, rows):
+    # Colunas tipadas: número do teste como float, datas como timestamp, o resto como texto
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    columns = {name: [row[idx] for row in rows] for idx, name in enumerate(HEADER) if name not in ('Step', 'Notes')}
+    columns['Step'] = [row[HEADER.index('Step')] for row in rows]
+    arrays = {
+        name: pa.array([None if v is None else float(v) for v in values], pa.float64()) if name == 'test number'
+        else pa.array(values, pa.timestamp('us')) if name == 'Date'
+        else pa.array([None if v is None else _csv_text(v) for v in values], pa.string())
+        for name, values in columns.items()
+    }
+    pq.write_table(pa.table(arrays), path)
+    return path
+
+def reference_tests(path):
+    return group_tests(pd.read_excel(path, dtype={'test number': str}))
+
+def assert_same_tests(actual, expected):
+    actual, expected = dict(actual), dict(expected)
+    assert list(actual) == list(expected)
+    assert [t.to_row() for t in actual.values()] == [t.to_row() for t in expected.values()]
+
+def test_edge_cells_match_read_excel(tmp_path):
+    path = write_xlsx(tmp_path / 'trials.xlsx', ROWS)
+    expected = reference_tests(path)
+    assert list(expected) == ['1', '2', '3']
+    assert_same_tests(iter_workbook_tests(path, '0'), expected)
+    assert_same_tests(group_tests(read_workbook(path, '0')), expected)
+
+    steps = expected['1'].steps
+    assert [step.text for step in steps] == ['Open breaker', '3']
+    assert steps[1].comment == 'Checked'
+    assert expected['1'].date == str(MARCH_1)
+
+def test_non_contiguous_tests_fall_back_to_full_read(tmp_path):
+    path = write_xlsx(tmp_path / 'trials.xlsx', ROWS + [LATE_ROW])
+    with pytest.raises(NonContiguousTestsError):
+        list(iter_workbook_tests(path, '0'))
+    expected = reference_tests(path)
+    assert_same_tests(load_tests(path, '0'), expected)
+    assert_same_tests(group_tests(read_workbook(path, '0')), expected)
+    assert [step.text for step in expected['1'].steps][-1] == 'Late step'
+
+@pytest.mark.parametrize('write_export', [write_csv, write_parquet])
+def test_exports_match_workbook(tmp_path, write_export):
+    rows = ROWS + [LATE_ROW]
+    expected = load_tests(write_xlsx(tmp_path / 'trials.xlsx', rows), '0')
+    export = write_export(tmp_path / ('trials.csv' if write_export is write_csv else 'trials.parquet'), rows)
+    assert_same_tests(load_tests(export, '0'), expected)
+    # Upload: bytes com o nome original do arquivo
+    assert_same_tests(load_tests(named_stream(export.read_bytes(), export.name), '0'), expected)
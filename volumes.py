@@ -0,0 +1,84 @@
+import io
+import json
+import zipfile
+from contextlib import closing
+from functools import partial
+
+from cache import default_cache
+from instrumentation import NULL_METRICS
+from multi_sheet import docx_name, render_docx_bytes, render_in_processes
+from report_core import load_tests
+from stream_writer import write_output
+
+# ==========================================
+# DIVISÃO EM VOLUMES (ZIP)
+# ==========================================
+# Apêndices com milhares de páginas ficam pesados para o Word abrir e para baixar. Aqui o
+# grouped_tests é dividido em volumes (um por seção e/ou no máximo N testes por volume);
+# cada volume é um DOCX completo, com o mesmo cabeçalho e o título "APPENDIX B", renderizado
+# em processos separados e gravado no zip junto com um índice (index.json) dos testes por arquivo.
+# Cada teste começa em página nova, então o limite de testes também limita as páginas do volume.
+
+MANIFEST_NAME = 'index.json'
+
+def split_volumes(grouped_tests, by_section=True, max_tests=None):
+    # Lista de dicionários grouped_tests, na ordem original
+    volumes = []
+    current_section = None
+    for test_number, test_info in grouped_tests.items():
+        new_section = test_info.section != current_section
+        current_section = test_info.section
+        if not volumes or (by_section and new_section) or (max_tests and len(volumes[-1]) >= max_tests):
+            volumes.append({})
+        volumes[-1][test_number] = test_info
+    return volumes
+
+def volume_name(index, volume, used=None):
+    first = next(iter(volume.values()))
+    return docx_name(f"Volume {index:02d} - {first.section}", used)
+
+def build_manifest(volumes, names):
+    return {
+        "volumes": [
+            {
+                "file": name,
+                "sections": list(dict.fromkeys(t.section for t in volume.values())),
+                "tests": [{"test number": number, "test": t.title} for number, t in volume.items()],
+                "first_test": next(iter(volume)),
+                "last_test": next(reversed(volume)),
+                "test_count": len(volume)
+            }
+            for name, volume in zip(names, volumes)
+        ]
+    }
+
+def write_volumes_zip(grouped_tests, cfg, fileobj, metrics=NULL_METRICS, by_section=True, max_tests=None, workers=None):
+    # Mesma assinatura dos writers (mais as opções de divisão); a saída é um .zip, não um .docx
+    volumes = split_volumes(grouped_tests, by_section, max_tests)
+    used = set()
+    names = [volume_name(i + 1, volume, used) for i, volume in enumerate(volumes)]
+    documents = render_in_processes(render_docx_bytes, volumes, cfg, workers)
+    with closing(documents), zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_STORED) as zout: # DOCX já é comprimido
+        # Os volumes entram no zip à medida que ficam prontos (na ordem), sem juntar tudo na memória
+        for name, volume, doc_bytes in zip(names, volumes, metrics.timed_iter('create_test_page', documents)):
+            metrics.count('tests', len(volume)); metrics.count('steps', sum(len(t.steps) for t in volume.values()))
+            with metrics.stage('doc_save'):
+                zout.writestr(name, doc_bytes)
+        zout.writestr(MANIFEST_NAME, json.dumps(build_manifest(volumes, names), ensure_ascii=False, indent=2, default=str))
+    metrics.count('volumes', len(volumes))
+    return fileobj
+
+def generate_volumes_zip(source, cfg, output_path=None, metrics=NULL_METRICS, by_section=True, max_tests=None, workers=None):
+    tests = load_tests(source, cfg.get('sheet_target', '0'), metrics)
+    metrics.expect('tests', len(tests))
+    return write_output(lambda f: write_volumes_zip(tests, cfg, f, metrics, by_section, max_tests, workers), output_path)
+
+def _volumes_job(by_section, max_tests, workers, cache, data, cfg, metrics, file_name=None):
+    _, tests, model_hit = (cache or default_cache).get_model(data, cfg.get('sheet_target', '0'), metrics, file_name)
+    metrics.expect('tests', len(tests))
+    buffer = write_volumes_zip(tests, cfg, io.BytesIO(), metrics, by_section, max_tests, workers)
+    return buffer.getvalue(), {'cache': 'model' if model_hit else None, 'volumes': metrics.counts.get('volumes', 0)}
+
+def volumes_task(by_section=True, max_tests=None, workers=None, cache=None):
+    # Tarefa para a fila de jobs; reaproveita o modelo agrupado do cache (o zip não entra no cache de DOCX)
+    return partial(_volumes_job, by_section, max_tests, workers, cache)